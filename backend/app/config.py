@@ -12,11 +12,26 @@ class Settings(BaseSettings):
 
     LOCAL_VIDEOS_PATH: str = "./local_data/videos"
     LOCAL_FRAMES_PATH: str = "./local_data/frames"
+    # Per-course recognition embeddings (.npy + sidecar JSON), memory-mapped
+    LOCAL_EMBEDDINGS_PATH: str = "./local_data/embeddings"
+    # Optional RAM-backed dir (e.g. /dev/shm) to stage uploaded videos in;
+    # staged videos are deleted once processed instead of kept in LOCAL_VIDEOS_PATH
+    VIDEO_STAGING_PATH: Optional[str] = None
 
     MODEL_DIR: str = os.environ.get("MODEL_DIR", "../models")
+    # Run SFace as float16 on onnxruntime's CUDA provider when available
+    # (needs onnxruntime-gpu, onnx and onnxconverter-common)
+    SFACE_ONNXRUNTIME: bool = False
+
+    # Frames per second of video analyzed for attendance; the rest are skipped
+    # without decoding. Requests can override it per video.
+    VIDEO_FRAMES_PER_SECOND: float = 2.0
 
     CORS_ORIGINS: str = "*"
 
+    # How long enrolled students + embeddings are cached per course (0 disables)
+    RECOGNITION_CACHE_TTL_SECONDS: int = 60
+
     class Config:
         env_file = str(Path(__file__).resolve().parent.parent / ".env")
         case_sensitive = True
@@ -1,5 +1,9 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+import asyncio
 import time
 
 from .config import settings
@@ -8,10 +12,33 @@ from .routers import enrollment, students, attendance
 from .services.detector import get_detector
 from .services.supabase_service import get_supabase_service
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    supabase = get_supabase_service()
+    detector = get_detector()
+
+    # Independent: Supabase client, YuNet and SFace load concurrently
+    await asyncio.gather(
+        asyncio.to_thread(supabase.initialize),
+        asyncio.to_thread(detector.initialize),
+        asyncio.to_thread(detector.initialize_recognizer, settings.SFACE_ONNXRUNTIME),
+    )
+
+    attendance.ensure_storage_dirs()
+
+    print("Backend initialized")
+    yield
+
+    supabase.close()
+
+
 app = FastAPI(
     title="MARK Attendance API",
     description="Face recognition-based attendance system backend",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 origins = [o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip()] or ["*"]
@@ -24,23 +51,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Listing responses (history, students, session records) compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.include_router(enrollment.router)
 app.include_router(students.router)
 app.include_router(attendance.router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    supabase = get_supabase_service()
-    supabase.initialize()
-
-    detector = get_detector()
-    detector.initialize()
-    detector.initialize_recognizer()
-
-    print("Backend initialized")
-
-
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     supabase = get_supabase_service()
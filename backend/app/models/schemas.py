@@ -53,10 +53,10 @@ class ProcessingProgressResponse(BaseModel):
 
 
 class StudentResponse(BaseModel):
-    id: UUID
+    id: str
     student_id: str
     student_name: str
-    user_id: UUID
+    user_id: str
     enrolled_at: Optional[datetime] = None
     status: str
     photo_urls: Optional[List[str]] = None
@@ -68,9 +68,9 @@ class StudentListResponse(BaseModel):
 
 
 class AttendanceSessionResponse(BaseModel):
-    id: UUID
-    course_id: Optional[UUID] = None
-    teacher_id: Optional[UUID] = None
+    id: str
+    course_id: Optional[str] = None
+    teacher_id: Optional[str] = None
     video_filename: Optional[str] = None
     total_frames: int
     total_students_present: int
@@ -81,9 +81,9 @@ class AttendanceSessionResponse(BaseModel):
 
 
 class AttendanceRecordResponse(BaseModel):
-    id: UUID
-    session_id: UUID
-    user_id: Optional[UUID] = None
+    id: str
+    session_id: str
+    user_id: Optional[str] = None
     student_name: str
     student_id: str
     is_present: bool
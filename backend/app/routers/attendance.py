@@ -7,11 +7,15 @@ from fastapi import (
     Query,
 )
 from typing import Optional, Dict
-from uuid import UUID
+import asyncio
 import time
 import threading
 import uuid
+import os
+import shutil
 import cv2
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 from ..models.schemas import (
@@ -32,31 +36,95 @@ router = APIRouter(prefix="/api/attendance", tags=["attendance"])
 # In-memory job tracker
 processing_jobs: Dict[str, dict] = {}
 
+# Best frames are reference evidence, not archival footage
+BEST_FRAME_MAX_WIDTH = 960
+BEST_FRAME_JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+
+
+# Storage locations, created once at startup (see ensure_storage_dirs)
+VIDEOS_DIR = Path(settings.VIDEO_STAGING_PATH or settings.LOCAL_VIDEOS_PATH)
+FRAMES_DIR = Path(settings.LOCAL_FRAMES_PATH)
+
+
+def ensure_storage_dirs() -> None:
+    VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+    FRAMES_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def best_frame_path(session_id: str, student_id: str, frames_dir: Path) -> Path:
+    return frames_dir / session_id / f"{student_id}_best.jpg"
+
+
+def encode_best_frame(frame_image: np.ndarray) -> Optional[np.ndarray]:
+    """Downscale and JPEG-encode a best frame; passed to process_video."""
+    height, width = frame_image.shape[:2]
+    if width > BEST_FRAME_MAX_WIDTH:
+        frame_image = cv2.resize(
+            frame_image,
+            (BEST_FRAME_MAX_WIDTH, round(height * BEST_FRAME_MAX_WIDTH / width)),
+            interpolation=cv2.INTER_AREA,
+        )
+
+    ok, buf = cv2.imencode(".jpg", frame_image, BEST_FRAME_JPEG_PARAMS)
+    return buf if ok else None
+
 
 def save_best_frame(
-    session_id: str, student_id: str, frame_image, frames_dir: Path
+    session_id: str, student_id: str, encoded: Future, frames_dir: Path
 ) -> str:
-    session_dir = frames_dir / session_id
-    session_dir.mkdir(parents=True, exist_ok=True)
+    # The session directory is created by the caller, once per session
+    frame_path = best_frame_path(session_id, student_id, frames_dir)
+
+    # Encoded during processing; write the bytes with raw os-level calls
+    buf = encoded.result()
+    if buf is None:
+        print(f"Failed to encode best frame for {student_id}")
+        return str(frame_path)
 
-    frame_path = session_dir / f"{student_id}_best.jpg"
-    cv2.imwrite(str(frame_path), frame_image)
+    data = memoryview(buf).cast("B")
+    fd = os.open(frame_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
 
     return str(frame_path)
 
 
+def copy_upload_to_disk(upload_file, dest_path: Path) -> None:
+    """Copy an upload's spooled temp file to dest_path without Python-level buffers when possible."""
+    upload_file.seek(0)
+    with open(dest_path, "wb") as out:
+        # Large uploads have rolled over to a real temp file: copy in-kernel
+        if getattr(upload_file, "_rolled", False):
+            try:
+                in_fd, out_fd = upload_file.fileno(), out.fileno()
+                offset = 0
+                while sent := os.sendfile(out_fd, in_fd, offset, 1 << 30):
+                    offset += sent
+                return
+            except (AttributeError, OSError):
+                upload_file.seek(0)
+                out.seek(0)
+                out.truncate()
+
+        shutil.copyfileobj(upload_file, out, 1 << 20)
+
+
 def _process_video_in_background(
     job_id: str,
     video_path: str,
     course_id: str,
     teacher_id: str,
     video_filename: str,
+    remove_video: bool = False,
+    frames_per_second: Optional[float] = None,
 ):
     """Run video processing in a background thread with progress updates."""
     detector = get_detector()
     supabase = get_supabase_service()
-    frames_dir = Path(settings.LOCAL_FRAMES_PATH)
-    frames_dir.mkdir(parents=True, exist_ok=True)
+    frames_dir = FRAMES_DIR
 
     try:
         enrolled_students = supabase.get_enrolled_students_for_recognition(course_id)
@@ -77,6 +145,8 @@ def _process_video_in_background(
             video_path,
             enrolled_students,
             progress_callback=progress_callback,
+            frames_per_second=frames_per_second or settings.VIDEO_FRAMES_PER_SECOND,
+            encode_best_frame=encode_best_frame,
         )
 
         if "error" in result:
@@ -92,26 +162,37 @@ def _process_video_in_background(
         best_frames = result.get("best_frames", {})
         total_frames = result.get("frames_processed", 0)
 
-        present_students = []
-        for student_id, data in recognized.items():
-            frames_detected = data.get("frames_detected", 0)
-            confidence = data.get("best_similarity", 0.0)
+        # Presence test over all recognized candidates at once
+        candidates = list(recognized.items())
+        frames_detected = np.fromiter(
+            (data.get("frames_detected", 0) for _, data in candidates),
+            dtype=np.int64,
+            count=len(candidates),
+        )
+        confidences = np.fromiter(
+            (data.get("best_similarity", 0.0) for _, data in candidates),
+            dtype=np.float64,
+            count=len(candidates),
+        )
+        present_mask = (frames_detected > 0) & (confidences >= 0.363)
 
-            if frames_detected > 0 and confidence >= 0.363:
-                present_students.append(
-                    {
-                        "student_id": student_id,
-                        "student_name": data.get("student_name"),
-                        "frames_detected": frames_detected,
-                        "confidence": confidence,
-                    }
-                )
+        present_students = []
+        for i in np.flatnonzero(present_mask).tolist():
+            student_id, data = candidates[i]
+            present_students.append(
+                {
+                    "student_id": student_id,
+                    "student_name": data.get("student_name"),
+                    "frames_detected": int(frames_detected[i]),
+                    "confidence": float(confidences[i]),
+                }
+            )
 
+        present_ids = {p["student_id"] for p in present_students}
         absent_students = []
         for student in enrolled_students:
             sid = student.get("student_id") or student.get("id")
-            found = any(p["student_id"] == sid for p in present_students)
-            if not found:
+            if sid not in present_ids:
                 absent_students.append(
                     {"student_id": sid, "student_name": student.get("student_name")}
                 )
@@ -134,52 +215,85 @@ def _process_video_in_background(
             return
 
         session_id_str = str(session_id)
+        enrollment_by_student_id = {s.get("student_id"): s for s in enrolled_students}
+
+        # Best frames (JPEG-encoded by process_video) are written on a thread
+        # pool while the records, whose frame paths are known up front, are
+        # inserted
+        if best_frames:
+            (frames_dir / session_id_str).mkdir(exist_ok=True)
+        with ThreadPoolExecutor() as frame_writer:
+            frame_writes = {}
+
+            records = []
+            for student in present_students:
+                frame_path = None
+                if student["student_id"] in best_frames:
+                    bf = best_frames[student["student_id"]]
+                    frame_writes[student["student_id"]] = frame_writer.submit(
+                        save_best_frame,
+                        session_id_str,
+                        student["student_id"],
+                        bf["encoded"],
+                        frames_dir,
+                    )
+                    frame_path = str(
+                        best_frame_path(
+                            session_id_str, student["student_id"], frames_dir
+                        )
+                    )
+
+                enrollment = enrollment_by_student_id.get(student["student_id"])
+
+                records.append(
+                    {
+                        "session_id": session_id_str,
+                        "user_id": enrollment.get("user_id") if enrollment else None,
+                        "student_name": student["student_name"],
+                        "student_id": student["student_id"],
+                        "is_present": True,
+                        "confidence_score": student["confidence"],
+                        "frames_detected": student["frames_detected"],
+                        "frames_total": total_frames,
+                        "best_frame_path": frame_path,
+                    }
+                )
 
-        for student in present_students:
-            best_frame_path = None
-            if student["student_id"] in best_frames:
-                bf = best_frames[student["student_id"]]
-                best_frame_path = save_best_frame(
-                    session_id_str, student["student_id"], bf["image"], frames_dir
+            for student in absent_students:
+                enrollment = enrollment_by_student_id.get(
+                    student.get("student_id")
                 )
 
-            enrollment = next(
-                (s for s in enrolled_students if s.get("student_id") == student["student_id"]),
-                None,
-            )
+                records.append(
+                    {
+                        "session_id": session_id_str,
+                        "user_id": enrollment.get("user_id") if enrollment else None,
+                        "student_name": student.get("student_name", ""),
+                        "student_id": student.get("student_id", ""),
+                        "is_present": False,
+                        "confidence_score": 0.0,
+                        "frames_detected": 0,
+                        "frames_total": total_frames,
+                        "best_frame_path": None,
+                    }
+                )
 
-            supabase.create_attendance_record(
-                session_id=session_id_str,
-                user_id=enrollment.get("user_id") if enrollment else None,
-                student_name=student["student_name"],
-                student_id=student["student_id"],
-                is_present=True,
-                confidence_score=student["confidence"],
-                frames_detected=student["frames_detected"],
-                frames_total=total_frames,
-                best_frame_path=best_frame_path,
-            )
+            records_saved = supabase.bulk_create_attendance_records(records)
 
-        for student in absent_students:
-            enrollment = next(
-                (
-                    s
-                    for s in enrolled_students
-                    if s.get("student_id") == student.get("student_id")
-                ),
-                None,
-            )
+        # The records are saved by now: a frame that failed to write only
+        # loses its thumbnail, and must not fail (and invite a retry of) the job
+        for student_id, write in frame_writes.items():
+            try:
+                write.result()
+            except Exception as e:
+                print(f"Failed to save best frame for {student_id}: {e}")
 
-            supabase.create_attendance_record(
-                session_id=session_id_str,
-                user_id=enrollment.get("user_id") if enrollment else None,
-                student_name=student.get("student_name", ""),
-                student_id=student.get("student_id", ""),
-                is_present=False,
-                confidence_score=0.0,
-                frames_detected=0,
-                frames_total=total_frames,
-            )
+        if not records_saved:
+            processing_jobs[job_id].update({
+                "status": "error",
+                "error": "Failed to save attendance records",
+            })
+            return
 
         processing_jobs[job_id].update({
             "status": "completed",
@@ -194,6 +308,9 @@ def _process_video_in_background(
             "status": "error",
             "error": str(e),
         })
+    finally:
+        if remove_video:
+            Path(video_path).unlink(missing_ok=True)
 
 
 @router.post("/process", response_model=ProcessingJobResponse)
@@ -201,6 +318,7 @@ async def process_attendance(
     course_id: str = Form(...),
     teacher_id: str = Form(...),
     video: UploadFile = File(...),
+    frames_per_second: Optional[float] = Form(None, gt=0, le=60),
 ):
     detector = get_detector()
     supabase = get_supabase_service()
@@ -209,24 +327,27 @@ async def process_attendance(
         raise HTTPException(status_code=503, detail="Database not available")
 
     if not detector.detector:
-        if not detector.initialize():
+        if not await asyncio.to_thread(detector.initialize):
             raise HTTPException(
                 status_code=503, detail="Face detection model not loaded"
             )
 
-    videos_dir = Path(settings.LOCAL_VIDEOS_PATH)
-    videos_dir.mkdir(parents=True, exist_ok=True)
+    # Staged videos (tmpfs) are only needed until processing finishes
+    staged = bool(settings.VIDEO_STAGING_PATH)
+    videos_dir = VIDEOS_DIR
 
     timestamp = int(time.time())
     video_filename = f"{timestamp}_{course_id}_{video.filename}"
     video_path = videos_dir / video_filename
 
-    contents = await video.read()
-    with open(video_path, "wb") as f:
-        f.write(contents)
+    # Copy the spooled upload straight to disk instead of reading it into memory;
+    # the copy and video probing run in worker threads, off the event loop
+    await asyncio.to_thread(copy_upload_to_disk, video.file, video_path)
 
-    video_info = detector.get_video_info(str(video_path))
+    video_info = await asyncio.to_thread(detector.get_video_info, str(video_path))
     if not video_info:
+        if staged:
+            video_path.unlink(missing_ok=True)
         raise HTTPException(status_code=400, detail="Invalid video file")
 
     # Create a job and start processing in background
@@ -240,7 +361,8 @@ async def process_attendance(
 
     thread = threading.Thread(
         target=_process_video_in_background,
-        args=(job_id, str(video_path), course_id, teacher_id, video_filename),
+        args=(job_id, str(video_path), course_id, teacher_id, video_filename, staged),
+        kwargs={"frames_per_second": frames_per_second},
         daemon=True,
     )
     thread.start()
@@ -275,16 +397,16 @@ async def get_attendance_session(session_id: str):
     if not supabase.is_initialized():
         raise HTTPException(status_code=503, detail="Database not available")
 
-    session = supabase.get_attendance_session(session_id)
+    # Session and its records in one request (records embedded via the FK)
+    session = await asyncio.to_thread(supabase.get_session_with_records, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Attendance session not found")
-
-    records = supabase.get_attendance_records(session_id)
+    records = session.get("attendance_records") or []
 
     session_response = AttendanceSessionResponse(
-        id=UUID(session["id"]),
-        course_id=UUID(session["course_id"]),
-        teacher_id=UUID(session["teacher_id"]),
+        id=session["id"],
+        course_id=session.get("course_id"),
+        teacher_id=session.get("teacher_id"),
         video_filename=session.get("video_filename"),
         total_frames=session.get("total_frames", 0),
         total_students_present=session.get("total_students_present", 0),
@@ -298,9 +420,9 @@ async def get_attendance_session(session_id: str):
     for record in records:
         records_response.append(
             AttendanceRecordResponse(
-                id=UUID(record["id"]),
-                session_id=UUID(record["session_id"]),
-                user_id=UUID(record["user_id"]) if record.get("user_id") else None,
+                id=record["id"],
+                session_id=record["session_id"],
+                user_id=record.get("user_id"),
                 student_name=record.get("student_name", ""),
                 student_id=record.get("student_id", ""),
                 is_present=record.get("is_present", False),
@@ -328,17 +450,21 @@ async def get_attendance_history(
     if not supabase.is_initialized():
         raise HTTPException(status_code=503, detail="Database not available")
 
-    sessions = supabase.get_attendance_history(
-        course_id=course_id, teacher_id=teacher_id, limit=limit, offset=offset
+    sessions, total = await asyncio.to_thread(
+        supabase.get_attendance_history,
+        course_id=course_id,
+        teacher_id=teacher_id,
+        limit=limit,
+        offset=offset,
     )
 
     sessions_response = []
     for session in sessions:
         sessions_response.append(
             AttendanceSessionResponse(
-                id=UUID(session["id"]),
-                course_id=UUID(session["course_id"]),
-                teacher_id=UUID(session["teacher_id"]),
+                id=session["id"],
+                course_id=session.get("course_id"),
+                teacher_id=session.get("teacher_id"),
                 video_filename=session.get("video_filename"),
                 total_frames=session.get("total_frames", 0),
                 total_students_present=session.get("total_students_present", 0),
@@ -349,4 +475,4 @@ async def get_attendance_history(
             )
         )
 
-    return AttendanceHistoryResponse(sessions=sessions_response, total=len(sessions))
+    return AttendanceHistoryResponse(sessions=sessions_response, total=total)
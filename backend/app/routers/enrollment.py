@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from typing import List, Optional
 from uuid import UUID
+import asyncio
 import cv2
 import numpy as np
 from datetime import datetime
@@ -12,7 +13,7 @@ from ..models.schemas import (
     RegisterEnrollmentResponse,
 )
 from ..services.detector import get_detector
-from ..services.supabase_service import get_supabase_service
+from ..services.supabase_service import EnrollmentConflictError, get_supabase_service
 from ..config import settings
 
 router = APIRouter(prefix="/api/enrollment", tags=["enrollment"])
@@ -31,7 +32,9 @@ async def check_enrollment(request: CheckEnrollmentRequest):
     if not student_id or not student_name:
         raise HTTPException(status_code=400, detail="Student ID and name are required")
 
-    result = supabase.check_enrollment_exists(student_id, student_name)
+    result = await asyncio.to_thread(
+        supabase.check_enrollment_exists, student_id, student_name
+    )
 
     message = "Student ID and name are available"
     if result["duplicate_id"]:
@@ -47,6 +50,39 @@ async def check_enrollment(request: CheckEnrollmentRequest):
     )
 
 
+def _decode_photo(contents: bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _extract_photo_embeddings(detector, frames: List[np.ndarray]) -> List[List[int]]:
+    photo_faces = []
+
+    for i, frame in enumerate(frames):
+        faces, face_count = detector.detect_faces(frame)
+
+        if faces is None or face_count == 0:
+            raise HTTPException(
+                status_code=400, detail=f"No face detected in photo {i + 1}"
+            )
+
+        if face_count > 1:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Multiple faces detected in photo {i + 1}. Please ensure only one face is visible.",
+            )
+
+        photo_faces.append(faces[0])
+
+    # One SFace forward pass for all photos
+    embeddings = detector.get_face_embeddings_batch(frames, photo_faces)
+    if embeddings is None:
+        raise HTTPException(
+            status_code=400, detail="Could not generate embeddings for the photos"
+        )
+
+    return [detector.quantize_embedding(embedding) for embedding in embeddings]
+
+
 @router.post("/register", response_model=RegisterEnrollmentResponse)
 async def register_enrollment(
     user_id: str = Form(...),
@@ -62,73 +98,70 @@ async def register_enrollment(
     if not supabase.is_initialized():
         raise HTTPException(status_code=503, detail="Database not available")
 
-    check_result = supabase.check_enrollment_exists(student_id, student_name)
-    if check_result["exists"]:
-        msg = (
-            "Student ID already registered"
-            if check_result["duplicate_id"]
-            else "Name already enrolled"
-        )
-        raise HTTPException(status_code=409, detail=msg)
-
     photos = [photo_1, photo_2, photo_3]
-    embeddings_list = []
-    photo_urls = []
-
-    for i, photo in enumerate(photos):
-        contents = await photo.read()
-
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    contents_list = await asyncio.gather(*(photo.read() for photo in photos))
 
+    # JPEG decoding releases the GIL: decode all photos concurrently off the loop
+    frames = await asyncio.gather(
+        *(asyncio.to_thread(_decode_photo, contents) for contents in contents_list)
+    )
+    for i, frame in enumerate(frames):
         if frame is None:
             raise HTTPException(
                 status_code=400, detail=f"Invalid image format for photo {i + 1}"
             )
 
-        faces, face_count = detector.detect_faces(frame)
-
-        if faces is None or face_count == 0:
-            raise HTTPException(
-                status_code=400, detail=f"No face detected in photo {i + 1}"
-            )
-
-        if face_count > 1:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Multiple faces detected in photo {i + 1}. Please ensure only one face is visible.",
-            )
-
-        embedding = detector.get_face_embedding(frame, faces[0])
-        if embedding is None:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Could not generate embedding for photo {i + 1}",
-            )
-
-        embeddings_list.append(embedding.tolist()[0])
-
-        # Upload photo to storage
-        file_path = f"{student_id.strip()}/{user_id.strip()}/photo_{i + 1}.jpg"
-        photo_url = supabase.upload_photo(file_path, contents, "image/jpeg")
+    # Face detection/embedding for all photos in one worker thread: the shared
+    # detector serializes YuNet/SFace calls with its locks, so per-photo threads
+    # would not overlap the CV work, and SFace embeds all photos in one pass
+    embeddings_list = await asyncio.to_thread(
+        _extract_photo_embeddings, detector, frames
+    )
 
-        if photo_url:
-            photo_urls.append(photo_url)
-        else:
+    # Storage uploads are independent network calls: run them concurrently
+    photo_paths = [
+        f"{student_id.strip()}/{user_id.strip()}/photo_{i + 1}.jpg"
+        for i in range(len(contents_list))
+    ]
+    photo_urls = await asyncio.gather(
+        *(
+            asyncio.to_thread(supabase.upload_photo, path, contents, "image/jpeg")
+            for path, contents in zip(photo_paths, contents_list)
+        )
+    )
+    for i, photo_url in enumerate(photo_urls):
+        if not photo_url:
+            uploaded = [path for path, url in zip(photo_paths, photo_urls) if url]
+            if uploaded:
+                await asyncio.to_thread(supabase.delete_photos, uploaded)
             raise HTTPException(
                 status_code=500, detail=f"Failed to upload photo {i + 1}"
             )
 
-    # Update the user's profile with enrollment data
-    success = supabase.create_enrollment(
-        user_id=user_id.strip(),
-        student_id=student_id.strip(),
-        student_name=student_name.strip(),
-        embeddings=embeddings_list,
-        photo_urls=photo_urls,
-    )
+    # Update the user's profile with enrollment data; duplicates are rejected
+    # by the database's unique constraints rather than a separate pre-check
+    try:
+        success = await asyncio.to_thread(
+            supabase.create_enrollment,
+            user_id=user_id.strip(),
+            student_id=student_id.strip(),
+            student_name=student_name.strip(),
+            embeddings=embeddings_list,
+            photo_urls=photo_urls,
+        )
+    except EnrollmentConflictError as e:
+        # The photos were uploaded for this attempt only; don't orphan them
+        await asyncio.to_thread(supabase.delete_photos, photo_paths)
+        msg = (
+            "Student ID already registered"
+            if e.duplicate_id or not e.duplicate_name
+            else "Name already enrolled"
+        )
+        raise HTTPException(status_code=409, detail=msg)
 
     if success:
+        # New or replaced embeddings must be visible to the next attendance run
+        supabase.invalidate_recognition_cache()
         return RegisterEnrollmentResponse(
             success=True,
             enrollment_id=None,
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
-from uuid import UUID
+import asyncio
 
 from ..models.schemas import StudentResponse, StudentListResponse
 from ..services.supabase_service import get_supabase_service
@@ -19,10 +19,12 @@ async def list_students(
     if not supabase.is_initialized():
         raise HTTPException(status_code=503, detail="Database not available")
 
-    profiles = supabase.get_enrollments(course_id)
+    profiles, total = await asyncio.to_thread(
+        supabase.get_enrollments, course_id, limit=limit, offset=offset
+    )
 
     students = []
-    for profile in profiles[offset : offset + limit]:
+    for profile in profiles:
         photo_urls = None
         if profile.get("photo_urls"):
             if isinstance(profile["photo_urls"], list):
@@ -32,17 +34,17 @@ async def list_students(
 
         students.append(
             StudentResponse(
-                id=UUID(profile["id"]),
+                id=profile["id"],
                 student_id=profile.get("student_id", ""),
                 student_name=profile.get("name", ""),
-                user_id=UUID(profile["id"]),
+                user_id=profile["id"],
                 enrolled_at=profile.get("created_at"),
                 status=profile.get("enrollment_status", "active"),
                 photo_urls=photo_urls,
             )
         )
 
-    return StudentListResponse(students=students, total=len(profiles))
+    return StudentListResponse(students=students, total=total)
 
 
 @router.get("/{profile_id}", response_model=StudentResponse)
@@ -52,7 +54,7 @@ async def get_student(profile_id: str):
     if not supabase.is_initialized():
         raise HTTPException(status_code=503, detail="Database not available")
 
-    profile = supabase.get_enrollment(profile_id)
+    profile = await asyncio.to_thread(supabase.get_enrollment, profile_id)
 
     if not profile:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -65,10 +67,10 @@ async def get_student(profile_id: str):
             photo_urls = list(profile["photo_urls"].values())
 
     return StudentResponse(
-        id=UUID(profile["id"]),
+        id=profile["id"],
         student_id=profile.get("student_id", ""),
         student_name=profile.get("name", ""),
-        user_id=UUID(profile["id"]),
+        user_id=profile["id"],
         enrolled_at=profile.get("created_at"),
         status=profile.get("enrollment_status", "active"),
         photo_urls=photo_urls,
@@ -82,13 +84,15 @@ async def delete_student(profile_id: str):
     if not supabase.is_initialized():
         raise HTTPException(status_code=503, detail="Database not available")
 
-    profile = supabase.get_enrollment(profile_id)
+    profile = await asyncio.to_thread(supabase.get_enrollment, profile_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    success = supabase.delete_enrollment(profile_id)
+    success = await asyncio.to_thread(supabase.delete_enrollment, profile_id)
 
     if success:
+        # Profile ids are auth user ids
+        supabase.invalidate_recognition_cache(user_id=profile_id)
         return {"success": True, "message": "Student enrollment deleted"}
     else:
         raise HTTPException(status_code=500, detail="Failed to delete student")
@@ -1,54 +1,309 @@
 import cv2
+import hashlib
+import httpx
 import numpy as np
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Tuple, Optional, Dict, List, Callable
 
+try:
+    # Optional: float16 SFace on the GPU (see initialize_recognizer)
+    import onnx
+    import onnxruntime as ort
+    from onnxconverter_common import float16
+except ImportError:
+    onnx = ort = float16 = None
+
+
+try:
+    import fcntl
+except ImportError:  # Windows: downloads are not serialized across processes
+    fcntl = None
+
+# Model file -> (URL, SHA-256); downloads are verified against the hash
+MODEL_SOURCES = {
+    "face_detection_yunet_2023mar.onnx": (
+        "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx",
+        "8f2383e4dd3cfbb4553ea8718107fc0423210dc964f9f4280604804ed2552fa4",
+    ),
+    "face_recognition_sface_2021dec.onnx": (
+        "https://github.com/opencv/opencv_zoo/raw/main/models/face_recognition_sface/face_recognition_sface_2021dec.onnx",
+        "0ba9fbfa01b5270c96627c4ef784da859931e02f04419c829e83484087c34e79",
+    ),
+}
+
+
+def _download(
+    url: str,
+    dest: Path,
+    sha256: Optional[str] = None,
+    retries: int = 3,
+    chunk_size: int = 1 << 20,
+) -> None:
+    """Stream url to dest via dest.part, resuming a partial file from an
+    earlier attempt. A .lock sidecar makes concurrent workers wait for the
+    first download. dest only appears, by rename, once complete and (with
+    sha256) verified; a corrupt download is discarded and raises ValueError.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + ".part")
+
+    with open(dest.with_name(dest.name + ".lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if dest.exists():
+            return  # another worker finished it while we waited
+
+        for attempt in range(retries):
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with httpx.stream(
+                    "GET", url, headers=headers, follow_redirects=True, timeout=30.0
+                ) as response:
+                    if response.status_code == 416:
+                        # Stale partial file the server can't resume; start over
+                        part.unlink()
+                        continue
+                    response.raise_for_status()
+                    # 206 resumes; a plain 200 means the server ignored the range
+                    resumed = response.status_code == 206
+                    digest = hashlib.sha256()
+                    with open(part, "r+b" if resumed else "wb") as f:
+                        if resumed:
+                            # Hash what is already on disk, then append
+                            while chunk := f.read(chunk_size):
+                                digest.update(chunk)
+                        for chunk in response.iter_bytes(chunk_size):
+                            f.write(chunk)
+                            digest.update(chunk)
+                        f.flush()
+                        os.fsync(f.fileno())
+                break
+            except httpx.HTTPError:
+                if attempt == retries - 1:
+                    raise
+        else:
+            raise RuntimeError(f"Could not download {url}")
 
-class FaceDetector:
-    def __init__(self, model_dir: str = "models"):
-        self.detector = None
-        self.recognizer = None
-        self.model_dir = Path(model_dir)
-        self.model_dir.mkdir(parents=True, exist_ok=True)
+        if sha256 and digest.hexdigest() != sha256:
+            part.unlink()
+            raise ValueError(f"Checksum mismatch for {dest.name}")
+        os.replace(part, dest)
 
-    def download_yunet_model(self) -> bool:
-        model_path = self.model_dir / "face_detection_yunet_2023mar.onnx"
 
-        if model_path.exists():
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put onto a bounded queue; gives up (False) once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
             return True
+        except queue.Full:
+            continue
+    return False
 
-        url = "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
 
+def _get(q: queue.Queue, stop: threading.Event):
+    """Get from a queue; returns None once the pipeline is stopped."""
+    while not stop.is_set():
         try:
-            import urllib.request
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+# face_quality_code results
+FACE_OK, FACE_TOO_SMALL, FACE_OFF_CENTER_X, FACE_OFF_CENTER_Y = range(4)
+FACE_QUALITY_MESSAGES = {
+    FACE_OK: "Good face quality",
+    FACE_TOO_SMALL: "Move closer to the camera",
+    FACE_OFF_CENTER_X: "Center your face horizontally",
+    FACE_OFF_CENTER_Y: "Center your face vertically",
+}
+
+
+def open_video(video_path: str) -> cv2.VideoCapture:
+    """Open a video with FFmpeg hardware-accelerated decoding (NVDEC, VAAPI, ...)
+    when available, falling back to OpenCV's default backend."""
+    try:
+        cap = cv2.VideoCapture(
+            video_path,
+            cv2.CAP_FFMPEG,
+            [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY],
+        )
+        if cap.isOpened():
+            return cap
+        cap.release()
+    except Exception as e:
+        print(f"Hardware-accelerated decoding unavailable: {e}")
+
+    return cv2.VideoCapture(video_path)
+
 
-            print(f"Downloading YuNet model from {url}...")
-            urllib.request.urlretrieve(url, model_path)
-            print("YuNet model downloaded successfully")
-            return True
-        except Exception as e:
-            print(f"Failed to download YuNet model: {e}")
-            return False
+def cuda_available() -> bool:
+    """Check whether OpenCV was built with CUDA and a CUDA device is present."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except Exception:
+        return False
 
-    def download_sface_model(self) -> bool:
-        model_path = self.model_dir / "face_recognition_sface_2021dec.onnx"
+
+def get_dnn_backend(use_cuda: bool = True) -> Tuple[int, int]:
+    """Return (backend_id, target_id) for OpenCV DNN models."""
+    if use_cuda and cuda_available():
+        return cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16
+    return cv2.dnn.DNN_BACKEND_DEFAULT, cv2.dnn.DNN_TARGET_CPU
+
+
+def ort_cuda_available() -> bool:
+    return ort is not None and "CUDAExecutionProvider" in ort.get_available_providers()
+
+
+def make_sface_fp16(src_path: Path, dst_path: Path) -> None:
+    """Save a float16 copy of SFace with a dynamic batch dimension.
+
+    The export pins batch=1 (and lists its weights as graph inputs), which
+    onnxruntime enforces. Inputs and outputs stay float32, so callers feed
+    the same blobs as for OpenCV DNN.
+    """
+    model = onnx.load(str(src_path))
+    initializers = {init.name for init in model.graph.initializer}
+    for graph_input in list(model.graph.input):
+        if graph_input.name in initializers:
+            model.graph.input.remove(graph_input)
+    for value in list(model.graph.input) + list(model.graph.output):
+        value.type.tensor_type.shape.dim[0].dim_param = "N"
+    model.graph.ClearField("value_info")
+
+    model = float16.convert_float_to_float16(model, keep_io_types=True)
+
+    tmp_path = dst_path.with_suffix(".tmp")
+    onnx.save(model, str(tmp_path))
+    os.replace(tmp_path, dst_path)
+
+
+def decode_yunet_outputs(
+    outputs: Dict[str, np.ndarray],
+    batch_index: int,
+    pad_size: Tuple[int, int],
+    score_threshold: float,
+    nms_threshold: float,
+    top_k: int,
+) -> Optional[np.ndarray]:
+    """Decode raw YuNet outputs for one image of a batch.
+
+    Mirrors FaceDetectorYN's post-processing and returns an (N, 15) array in
+    the same format, or None if no faces.
+    """
+    pad_w, pad_h = pad_size
+    boxes, scores, landmarks = [], [], []
+
+    for stride in FaceDetector.STRIDES:
+        cols, rows = pad_w // stride, pad_h // stride
+        n = cols * rows
+        rows_slice = slice(batch_index * n, (batch_index + 1) * n)
+
+        cls = outputs[f"cls_{stride}"].reshape(-1)[rows_slice]
+        obj = outputs[f"obj_{stride}"].reshape(-1)[rows_slice]
+        bbox = outputs[f"bbox_{stride}"].reshape(-1, 4)[rows_slice]
+        kps = outputs[f"kps_{stride}"].reshape(-1, 5, 2)[rows_slice]
+
+        idx = np.arange(n)
+        r = (idx // cols).astype(np.float32)
+        c = (idx % cols).astype(np.float32)
+
+        cx = (c + bbox[:, 0]) * stride
+        cy = (r + bbox[:, 1]) * stride
+        w = np.exp(bbox[:, 2]) * stride
+        h = np.exp(bbox[:, 3]) * stride
+        boxes.append(np.stack([cx - w / 2, cy - h / 2, w, h], axis=1))
+
+        kx = (kps[:, :, 0] + c[:, None]) * stride
+        ky = (kps[:, :, 1] + r[:, None]) * stride
+        landmarks.append(np.stack([kx, ky], axis=2).reshape(-1, 10))
+
+        scores.append(np.sqrt(np.clip(cls, 0, 1) * np.clip(obj, 0, 1)))
+
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    landmarks = np.concatenate(landmarks)
+
+    keep = cv2.dnn.NMSBoxes(
+        boxes.tolist(), scores.tolist(), score_threshold, nms_threshold, 1.0, top_k
+    )
+    if len(keep) == 0:
+        return None
+
+    keep = np.asarray(keep).ravel()
+    return np.hstack([boxes[keep], landmarks[keep], scores[keep, None]]).astype(
+        np.float32
+    )
+
+
+class FaceDetector:
+    SCORE_THRESHOLD = 0.8
+    NMS_THRESHOLD = 0.3
+    TOP_K = 5000
+    STRIDES = (8, 16, 32)
+    MATRIX_CACHE_SIZE = 8
+    MIN_FACE_SIZE = 100
+
+    def __init__(self, model_dir: str = "models", use_cuda: bool = True):
+        self.detector = None
+        # OpenCV DNN backend/target for YuNet and SFace, probed once here so
+        # initialize and initialize_recognizer can run concurrently
+        self.backend_id, self.target_id = get_dnn_backend(use_cuda)
+        # Size YuNet was last configured for; setInputSize rebuilds its priors
+        self._last_size: Optional[Tuple[int, int]] = None
+        # Raw YuNet network for batched video detection (see detect_faces_batch)
+        self.batch_net = None
+        self.recognizer = None
+        # Raw SFace network for batched embedding (see get_face_embeddings)
+        self.sface_net = None
+        # onnxruntime float16 SFace on CUDA, used instead of sface_net when set
+        self.sface_session = None
+        # Per-thread alignment/blob buffers for get_face_embeddings
+        self._buffers = threading.local()
+        # The detector is shared by concurrent requests and video jobs, but
+        # an OpenCV net keeps its input between setInput and forward (and
+        # FaceDetectorYN its input size), so each network is used under a lock
+        self._detect_lock = threading.Lock()
+        self._batch_net_lock = threading.Lock()
+        self._sface_lock = threading.Lock()
+        self.model_dir = Path(model_dir)
+        # (enrolled list, build_embedding_matrix result) pairs, most recent
+        # last; see get_embedding_matrix
+        self._matrix_cache: List[Tuple[List[Dict], Tuple]] = []
+        self._matrix_cache_lock = threading.Lock()
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+
+    def _download_model(self, filename: str, label: str) -> bool:
+        model_path = self.model_dir / filename
 
         if model_path.exists():
             return True
 
-        url = "https://github.com/opencv/opencv_zoo/raw/main/models/face_recognition_sface/face_recognition_sface_2021dec.onnx"
+        url, sha256 = MODEL_SOURCES[filename]
 
         try:
-            import urllib.request
-
-            print(f"Downloading SFace model from {url}...")
-            urllib.request.urlretrieve(url, model_path)
-            print("SFace model downloaded successfully")
+            print(f"Downloading {label} model from {url}...")
+            _download(url, model_path, sha256)
+            print(f"{label} model downloaded successfully")
             return True
         except Exception as e:
-            print(f"Failed to download SFace model: {e}")
+            print(f"Failed to download {label} model: {e}")
             return False
 
+    def download_yunet_model(self) -> bool:
+        return self._download_model("face_detection_yunet_2023mar.onnx", "YuNet")
+
+    def download_sface_model(self) -> bool:
+        return self._download_model("face_recognition_sface_2021dec.onnx", "SFace")
+
     def initialize(self, input_size: Tuple[int, int] = (640, 480)) -> bool:
         if not self.download_yunet_model():
             return False
@@ -60,42 +315,154 @@ class FaceDetector:
                 str(model_path),
                 "",
                 input_size,
-                score_threshold=0.8,
-                nms_threshold=0.3,
-                top_k=5000,
+                score_threshold=self.SCORE_THRESHOLD,
+                nms_threshold=self.NMS_THRESHOLD,
+                top_k=self.TOP_K,
+                backend_id=self.backend_id,
+                target_id=self.target_id,
             )
+            self._last_size = tuple(input_size)
             return True
         except Exception as e:
             print(f"Failed to initialize YuNet: {e}")
             return False
 
-    def initialize_recognizer(self) -> bool:
+    def initialize_recognizer(self, use_onnxruntime: bool = False) -> bool:
+        """Load SFace. With use_onnxruntime, embeddings run as float16 on
+        onnxruntime's CUDA provider when it is available; alignment stays in
+        OpenCV either way."""
         if not self.download_sface_model():
             return False
 
         model_path = self.model_dir / "face_recognition_sface_2021dec.onnx"
 
         try:
-            self.recognizer = cv2.FaceRecognizerSF.create(str(model_path), "")
-            return True
+            self.recognizer = cv2.FaceRecognizerSF.create(
+                str(model_path), "", self.backend_id, self.target_id
+            )
+            self.sface_net = self._read_net(model_path)
         except Exception as e:
             print(f"Failed to initialize SFace: {e}")
             return False
 
+        if use_onnxruntime and ort_cuda_available():
+            try:
+                self.sface_session = self._create_sface_session(model_path)
+            except Exception as e:
+                print(f"onnxruntime SFace unavailable, using OpenCV DNN: {e}")
+
+        return True
+
+    def _read_net(self, model_path: Path):
+        net = cv2.dnn.readNetFromONNX(str(model_path))
+        if self.backend_id != cv2.dnn.DNN_BACKEND_DEFAULT:
+            net.setPreferableBackend(self.backend_id)
+            net.setPreferableTarget(self.target_id)
+        return net
+
+    @staticmethod
+    def _create_sface_session(model_path: Path):
+        fp16_path = model_path.with_name(model_path.stem + "_fp16.onnx")
+        if not fp16_path.exists():
+            make_sface_fp16(model_path, fp16_path)
+
+        return ort.InferenceSession(
+            str(fp16_path),
+            providers=[
+                ("CUDAExecutionProvider", {"cudnn_conv_use_max_workspace": "1"}),
+                "CPUExecutionProvider",
+            ],
+        )
+
     def detect_faces(self, frame: np.ndarray) -> Tuple[Optional[np.ndarray], int]:
         if self.detector is None:
             return None, 0
 
         height, width = frame.shape[:2]
-        self.detector.setInputSize((width, height))
+        with self._detect_lock:
+            if (width, height) != self._last_size:
+                self.detector.setInputSize((width, height))
+                self._last_size = (width, height)
 
-        _, faces = self.detector.detect(frame)
+            _, faces = self.detector.detect(frame)
 
         if faces is None:
             return None, 0
 
         return faces, len(faces)
 
+    def detect_faces_batch(
+        self, frames: List[np.ndarray], max_width: Optional[int] = None
+    ) -> List[Tuple[Optional[np.ndarray], int]]:
+        """Detect faces in several same-sized frames.
+
+        Frames wider than max_width are downscaled first and the detections
+        mapped back to full-frame coordinates. On the CUDA backend the frames
+        go through one batched YuNet forward pass; on CPU a batched pass is
+        slower and much larger than FaceDetectorYN per frame, so that is used.
+
+        Returns one detect_faces-style (faces, count) pair per frame.
+        """
+        if self.detector is None or not frames:
+            return [(None, 0)] * len(frames)
+
+        height, width = frames[0].shape[:2]
+        scale = 1.0
+        if max_width and width > max_width:
+            scale = max_width / width
+            size = (max_width, int(round(height * scale)))
+            frames = [
+                cv2.resize(f, size, interpolation=cv2.INTER_AREA) for f in frames
+            ]
+
+        if self.backend_id == cv2.dnn.DNN_BACKEND_CUDA:
+            results = self._detect_faces_net(frames)
+        else:
+            results = [self.detect_faces(f) for f in frames]
+
+        if scale != 1.0:
+            for faces, _ in results:
+                if faces is not None:
+                    faces[:, :14] /= scale  # boxes and landmarks; 14 is the score
+        return results
+
+    def _detect_faces_net(
+        self, frames: List[np.ndarray]
+    ) -> List[Tuple[Optional[np.ndarray], int]]:
+        """One raw YuNet forward pass over a batch of same-sized frames."""
+        # YuNet needs input dimensions that are multiples of 32
+        height, width = frames[0].shape[:2]
+        pad_w = ((width - 1) // 32 + 1) * 32
+        pad_h = ((height - 1) // 32 + 1) * 32
+        padded = [
+            cv2.copyMakeBorder(
+                f, 0, pad_h - height, 0, pad_w - width, cv2.BORDER_CONSTANT, value=0
+            )
+            for f in frames
+        ]
+
+        blob = cv2.dnn.blobFromImages(padded)
+        with self._batch_net_lock:
+            if self.batch_net is None:
+                model_path = self.model_dir / "face_detection_yunet_2023mar.onnx"
+                self.batch_net = self._read_net(model_path)
+            self.batch_net.setInput(blob)
+            names = self.batch_net.getUnconnectedOutLayersNames()
+            outputs = dict(zip(names, self.batch_net.forward(names)))
+
+        results = []
+        for i in range(len(frames)):
+            faces = decode_yunet_outputs(
+                outputs,
+                i,
+                (pad_w, pad_h),
+                self.SCORE_THRESHOLD,
+                self.NMS_THRESHOLD,
+                self.TOP_K,
+            )
+            results.append((faces, 0 if faces is None else len(faces)))
+        return results
+
     def get_face_embedding(
         self, frame: np.ndarray, face_detection: np.ndarray
     ) -> Optional[np.ndarray]:
@@ -105,43 +472,102 @@ class FaceDetector:
 
         try:
             aligned_face = self.recognizer.alignCrop(frame, face_detection)
-            embedding = self.recognizer.feature(aligned_face)
+            with self._sface_lock:
+                embedding = self.recognizer.feature(aligned_face)
             return embedding
         except Exception as e:
             print(f"Failed to generate embedding: {e}")
             return None
 
+    def get_face_embeddings(
+        self, frame: np.ndarray, faces: np.ndarray
+    ) -> Optional[np.ndarray]:
+        """Embed every detected face of a frame with one SFace forward pass.
+
+        Returns an (N, 128) float32 array, row i matching
+        get_face_embedding(frame, faces[i]).
+        """
+        return self.get_face_embeddings_batch([frame] * len(faces), faces)
+
+    def get_face_embeddings_batch(
+        self, frames: List[np.ndarray], faces: List[np.ndarray]
+    ) -> Optional[np.ndarray]:
+        """Embed faces[i] of frames[i] for all i with one SFace forward pass,
+        e.g. one face from each enrollment photo. Returns an (N, 128) array."""
+        if self.recognizer is None:
+            if not self.initialize_recognizer():
+                return None
+
+        try:
+            # Crop and blob buffers are reused across calls (per thread, since
+            # the detector is shared); the blob only grows with the face count
+            buffers = self._buffers
+            n = len(faces)
+            if getattr(buffers, "face_blob", None) is None:
+                buffers.aligned = np.empty((112, 112, 3), dtype=np.uint8)
+                buffers.face_blob = np.empty((0, 3, 112, 112), dtype=np.float32)
+            if len(buffers.face_blob) < n:
+                buffers.face_blob = np.empty((n, 3, 112, 112), dtype=np.float32)
+
+            blob = buffers.face_blob[:n]
+            for i, (frame, face) in enumerate(zip(frames, faces)):
+                aligned = self.recognizer.alignCrop(frame, face, buffers.aligned)
+                # Same preprocessing as FaceRecognizerSF.feature: RGB, no
+                # scaling; BGR->RGB, HWC->CHW and uint8->float32 in one write
+                blob[i] = aligned[:, :, ::-1].transpose(2, 0, 1)
+
+            if self.sface_session is not None:
+                return self.sface_session.run(None, {"data": blob})[0]
+            with self._sface_lock:
+                self.sface_net.setInput(blob)
+                return self.sface_net.forward()
+        except Exception as e:
+            print(f"Failed to generate embeddings: {e}")
+            return None
+
     @staticmethod
     def cosine_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
-        e1 = np.array(embedding1).flatten()
-        e2 = np.array(embedding2).flatten()
-
-        dot_product = np.dot(e1, e2)
-        norm1 = np.linalg.norm(e1)
-        norm2 = np.linalg.norm(e2)
+        # asarray/ravel avoid copies for ndarrays; stored embeddings may be lists
+        e1 = np.asarray(embedding1, dtype=np.float32).ravel()
+        e2 = np.asarray(embedding2, dtype=np.float32).ravel()
 
-        if norm1 == 0 or norm2 == 0:
+        denom = np.sqrt(np.vdot(e1, e1) * np.vdot(e2, e2))
+        if denom == 0:
             return 0.0
-        return float(dot_product / (norm1 * norm2))
+        return float(np.dot(e1, e2) / denom)
+
+    @staticmethod
+    def face_quality_bounds(
+        frame_w: int, frame_h: int
+    ) -> Tuple[float, float, float, float]:
+        """Allowed face-center range (x_lo, x_hi, y_lo, y_hi): the middle half
+        of the frame. Compute once per resolution for face_quality_code."""
+        return frame_w * 0.25, frame_w * 0.75, frame_h * 0.25, frame_h * 0.75
+
+    @classmethod
+    def face_quality_code(
+        cls, face: np.ndarray, bounds: Tuple[float, float, float, float]
+    ) -> int:
+        """FACE_OK or the first failed check; YuNet boxes are compared as floats."""
+        x, y, w, h = face[0], face[1], face[2], face[3]
+
+        if w < cls.MIN_FACE_SIZE or h < cls.MIN_FACE_SIZE:
+            return FACE_TOO_SMALL
+
+        x_lo, x_hi, y_lo, y_hi = bounds
+        if not (x_lo < x + w / 2 < x_hi):
+            return FACE_OFF_CENTER_X
+        if not (y_lo < y + h / 2 < y_hi):
+            return FACE_OFF_CENTER_Y
+
+        return FACE_OK
 
     def check_face_quality(
         self, frame: np.ndarray, face: np.ndarray
     ) -> Tuple[bool, str]:
-        x, y, w, h = int(face[0]), int(face[1]), int(face[2]), int(face[3])
-
-        if w < 100 or h < 100:
-            return False, "Move closer to the camera"
-
         frame_h, frame_w = frame.shape[:2]
-        center_x = x + w // 2
-        center_y = y + h // 2
-
-        if not (frame_w * 0.25 < center_x < frame_w * 0.75):
-            return False, "Center your face horizontally"
-        if not (frame_h * 0.25 < center_y < frame_h * 0.75):
-            return False, "Center your face vertically"
-
-        return True, "Good face quality"
+        code = self.face_quality_code(face, self.face_quality_bounds(frame_w, frame_h))
+        return code == FACE_OK, FACE_QUALITY_MESSAGES[code]
 
     def recognize_face(
         self,
@@ -149,24 +575,102 @@ class FaceDetector:
         enrolled_embeddings: List[Dict],
         threshold: float = 0.363,
     ) -> Tuple[Optional[str], Optional[str], float]:
-        best_match = None
-        best_name = None
-        best_similarity = 0.0
+        return self.match_embedding(
+            embedding, self.get_embedding_matrix(enrolled_embeddings), threshold
+        )
+
+    def get_embedding_matrix(
+        self, enrolled_students: List[Dict]
+    ) -> Tuple[np.ndarray, List[str], List[str]]:
+        """build_embedding_matrix(), cached by the identity of the list passed in.
+
+        SupabaseService returns the same cached list per course until its TTL
+        expires, so repeated videos for a course reuse one matrix.
+        """
+        with self._matrix_cache_lock:
+            for i, (source, matrix) in enumerate(self._matrix_cache):
+                if source is enrolled_students:
+                    self._matrix_cache.append(self._matrix_cache.pop(i))
+                    return matrix
+
+        matrix = self.build_embedding_matrix(enrolled_students)
+        with self._matrix_cache_lock:
+            self._matrix_cache.append((enrolled_students, matrix))
+            del self._matrix_cache[: -self.MATRIX_CACHE_SIZE]
+        return matrix
+
+    @staticmethod
+    def quantize_embedding(embedding: np.ndarray) -> List[int]:
+        """Quantize an embedding to int8 values for storage.
+
+        The vector is scaled so its largest component maps to +-127, which
+        keeps more precision than scaling the unit vector by 127. Matching
+        only uses cosine similarity, so the scale is not stored; int and
+        float embeddings load the same way in build_embedding_matrix. The
+        matrix itself stays float32: numpy upcasts int8 operands, so an int8
+        matrix would add a conversion per frame instead of saving bandwidth.
+        """
+        emb = np.asarray(embedding, dtype=np.float32).ravel()
+        peak = float(np.abs(emb).max())
+        if peak == 0:
+            return [0] * emb.size
+        return np.round(emb * (127.0 / peak)).astype(np.int8).tolist()
 
-        for student in enrolled_embeddings:
+    @staticmethod
+    def build_embedding_matrix(
+        enrolled_students: List[Dict],
+    ) -> Tuple[np.ndarray, List[str], List[str]]:
+        """Stack every enrolled embedding into one L2-normalized (M, 128) float32 matrix.
+
+        A student's embeddings may be raw lists or an already L2-normalized
+        float32 ndarray (see SupabaseService.get_enrolled_students_for_recognition),
+        which is used as-is.
+
+        Returns (matrix, owner_ids, owner_names) with one owner entry per matrix row.
+        """
+        blocks, owner_ids, owner_names = [], [], []
+        for student in enrolled_students:
+            embeddings = student.get("embeddings")
+            if embeddings is None or len(embeddings) == 0:
+                continue
+
+            if isinstance(embeddings, np.ndarray):
+                block = embeddings.reshape(len(embeddings), -1)
+            else:
+                block = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                block = block / norms
+
+            blocks.append(block)
             student_id = student.get("student_id") or student.get("id")
-            student_name = student.get("student_name")
-            embeddings_list = student.get("embeddings", [])
+            owner_ids.extend([student_id] * len(block))
+            owner_names.extend([student.get("student_name")] * len(block))
+
+        if not blocks:
+            return np.empty((0, 128), dtype=np.float32), [], []
 
-            for enrolled_emb in embeddings_list:
-                similarity = self.cosine_similarity(embedding, enrolled_emb)
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = student_id
-                    best_name = student_name
+        return np.vstack(blocks), owner_ids, owner_names
+
+    @staticmethod
+    def match_embedding(
+        embedding: np.ndarray,
+        embedding_matrix: Tuple[np.ndarray, List[str], List[str]],
+        threshold: float = 0.363,
+    ) -> Tuple[Optional[str], Optional[str], float]:
+        """recognize_face against a precomputed build_embedding_matrix() result."""
+        matrix, owner_ids, owner_names = embedding_matrix
+        probe = np.asarray(embedding, dtype=np.float32).ravel()
+        probe_norm = np.linalg.norm(probe)
+        if not owner_ids or probe_norm == 0:
+            return None, None, 0.0
+
+        sims = matrix @ (probe / probe_norm)
+        best = int(np.argmax(sims))
+        best_similarity = max(float(sims[best]), 0.0)
 
         if best_similarity >= threshold:
-            return best_match, best_name, best_similarity
+            return owner_ids[best], owner_names[best], best_similarity
 
         return None, None, best_similarity
 
@@ -176,105 +680,230 @@ class FaceDetector:
         enrolled_students: List[Dict],
         progress_callback: Optional[Callable[[float], None]] = None,
         frames_per_second: float = 2.0,
+        embedding_matrix: Optional[Tuple[np.ndarray, List[str], List[str]]] = None,
+        prefetch: int = 2,
+        frame_stride: Optional[int] = None,
+        detection_batch_size: int = 4,
+        detect_max_width: Optional[int] = 1280,
+        encode_best_frame: Optional[Callable[[np.ndarray], object]] = None,
     ) -> Dict:
-        cap = cv2.VideoCapture(video_path)
+        cap = open_video(video_path)
         if not cap.isOpened():
             return {"error": "Cannot open video"}
 
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
 
-        # Calculate sample interval: process only N frames per second
-        sample_interval = max(1, int(fps / frames_per_second))
+        # Enrolled embeddings as one normalized matrix, reused across videos
+        # for the same enrolled list
+        if embedding_matrix is None:
+            embedding_matrix = self.get_embedding_matrix(enrolled_students)
+
+        # Calculate sample interval: process only N frames per second,
+        # unless the caller picked an explicit stride
+        if frame_stride is not None:
+            sample_interval = max(1, int(frame_stride))
+        else:
+            sample_interval = max(1, int(fps / frames_per_second))
 
         recognized_students: Dict[str, Dict] = {}
         best_frames: Dict[str, Dict] = {}
-        face_counts: List[int] = []
-        frame_num = 0
+        # One count per decoded frame; CAP_PROP_FRAME_COUNT is only an
+        # estimate, so the array grows if the video runs longer
+        face_counts = np.zeros(max(total_frames, 0), dtype=np.int32)
         frames_actually_processed = 0
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Only process sampled frames
-            if frame_num % sample_interval == 0:
-                frames_actually_processed += 1
-
-                faces, face_count = self.detect_faces(frame)
-                face_counts.append(face_count)
+        # Decode thread -> detect thread -> embed/recognize here. The decoder
+        # hands over batches of frames for one YuNet pass each, so YuNet on
+        # batch N overlaps decoding N+1 and SFace on N-1. At most `prefetch`
+        # batches wait in each queue.
+        read_q: "queue.Queue" = queue.Queue(maxsize=prefetch)
+        detect_q: "queue.Queue" = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+        errors: List[Exception] = []
+        frames_decoded = [0]
+
+        def decode_stage():
+            frame_num = 0
+            batch: List[Tuple[int, np.ndarray]] = []
+            try:
+                while not stop.is_set():
+                    # grab() only demuxes; skipped frames are never decoded to BGR
+                    if not cap.grab():
+                        break
+
+                    # Only process sampled frames
+                    if frame_num % sample_interval == 0:
+                        ret, frame = cap.retrieve()
+                        if not ret:
+                            break
+                        batch.append((frame_num, frame))
+                        if len(batch) == detection_batch_size:
+                            if not _put(read_q, batch, stop):
+                                break
+                            batch = []
+
+                    frame_num += 1
+
+                if batch:
+                    _put(read_q, batch, stop)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                frames_decoded[0] = frame_num
+                _put(read_q, None, stop)
+
+        def detect_stage():
+            try:
+                while True:
+                    item = _get(read_q, stop)
+                    if item is None:
+                        break
+                    detections = self.detect_faces_batch(
+                        [frame for _, frame in item], detect_max_width
+                    )
+                    if not _put(detect_q, (item, detections), stop):
+                        break
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                _put(detect_q, None, stop)
+
+        workers = [
+            threading.Thread(target=decode_stage, daemon=True),
+            threading.Thread(target=detect_stage, daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
 
-                if faces is not None and face_count > 0:
-                    for face in faces:
-                        embedding = self.get_face_embedding(frame, face)
-                        if embedding is not None:
-                            student_id, student_name, similarity = self.recognize_face(
-                                embedding, enrolled_students
+        try:
+            while True:
+                batch = _get(detect_q, stop)
+                if batch is None:
+                    break
+                item, detections = batch
+
+                for (frame_num, frame), (faces, face_count) in zip(item, detections):
+                    frames_actually_processed += 1
+                    # Hold the sampled count over the skipped frames so
+                    # face_counts stays one entry per decoded frame
+                    end = frame_num + sample_interval
+                    if end > len(face_counts):
+                        grow = np.zeros(max(end, len(face_counts)), np.int32)
+                        face_counts = np.concatenate([face_counts, grow])
+                    face_counts[frame_num:end] = face_count
+
+                    if faces is not None and face_count > 0:
+                        embeddings = self.get_face_embeddings(frame, faces)
+                        if embeddings is None:
+                            embeddings = [None] * face_count
+
+                        for face, embedding in zip(faces, embeddings):
+                            if embedding is None:
+                                continue
+
+                            student_id, student_name, similarity = self.match_embedding(
+                                embedding, embedding_matrix
                             )
+                            if not student_id:
+                                continue
+
+                            if student_id not in recognized_students:
+                                recognized_students[student_id] = {
+                                    "student_name": student_name,
+                                    "frames_detected": 0,
+                                    "best_similarity": 0.0,
+                                }
+
+                            student = recognized_students[student_id]
+                            student["frames_detected"] += 1
+
+                            # Only remember where the best frame is; it is
+                            # re-read and annotated once after the loop
+                            if similarity > student["best_similarity"]:
+                                student["best_similarity"] = similarity
+                                best_frames[student_id] = {
+                                    "frame_num": frame_num,
+                                    "face": face[:4].tolist(),
+                                    "similarity": similarity,
+                                }
+
+                    if progress_callback:
+                        progress_callback((frame_num + 1) / max(total_frames, 1))
+
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
 
-                            if student_id:
-                                if student_id not in recognized_students:
-                                    recognized_students[student_id] = {
-                                        "student_name": student_name,
-                                        "frames_detected": 0,
-                                        "best_similarity": 0.0,
-                                    }
-
-                                recognized_students[student_id]["frames_detected"] += 1
-
-                                if (
-                                    similarity
-                                    > recognized_students[student_id]["best_similarity"]
-                                ):
-                                    recognized_students[student_id]["best_similarity"] = (
-                                        similarity
-                                    )
-
-                                    x, y, w, h = (
-                                        int(face[0]),
-                                        int(face[1]),
-                                        int(face[2]),
-                                        int(face[3]),
-                                    )
-                                    best_frame = frame.copy()
-                                    cv2.rectangle(
-                                        best_frame, (x, y), (x + w, y + h), (0, 255, 0), 2
-                                    )
-                                    label = f"{student_name} ({similarity:.0%})"
-                                    cv2.putText(
-                                        best_frame,
-                                        label,
-                                        (x, y - 10),
-                                        cv2.FONT_HERSHEY_SIMPLEX,
-                                        0.6,
-                                        (0, 255, 0),
-                                        2,
-                                    )
-                                    best_frames[student_id] = {
-                                        "frame_num": frame_num,
-                                        "image": best_frame,
-                                        "similarity": similarity,
-                                    }
-
-            if progress_callback:
-                progress_callback((frame_num + 1) / total_frames)
-
-            frame_num += 1
+        try:
+            if errors:
+                raise errors[0]
+            self._annotate_best_frames(
+                cap, best_frames, recognized_students, encode_best_frame
+            )
+        finally:
+            cap.release()
 
-        cap.release()
+        face_counts = face_counts[: frames_decoded[0]]
 
         return {
             "total_frames": total_frames,
             "frames_processed": frames_actually_processed,
-            "frames_sampled_from": frame_num,
+            "frames_sampled_from": frames_decoded[0],
             "fps": fps,
             "sample_interval": sample_interval,
             "recognized_students": recognized_students,
             "best_frames": best_frames,
-            "face_counts": face_counts,
+            "face_counts": face_counts.tolist(),
         }
 
+    @staticmethod
+    def _annotate_best_frames(
+        cap: cv2.VideoCapture,
+        best_frames: Dict[str, Dict],
+        recognized_students: Dict,
+        encode_best_frame: Optional[Callable[[np.ndarray], object]] = None,
+    ) -> None:
+        # With an encoder, each annotated frame is encoded on a worker thread
+        # (cv2 encoders release the GIL) while the next one is read, and only
+        # the encoded result is kept, as a Future under "encoded"
+        encoder = ThreadPoolExecutor() if encode_best_frame else None
+
+        # Seek in frame order so consecutive reads move forward through the file
+        for student_id, best in sorted(
+            best_frames.items(), key=lambda item: item[1]["frame_num"]
+        ):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, best["frame_num"])
+            ret, frame = cap.read()
+            if not ret:
+                del best_frames[student_id]
+                continue
+
+            x, y, w, h = (int(v) for v in best["face"])
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            student_name = recognized_students[student_id]["student_name"]
+            label = f"{student_name} ({best['similarity']:.0%})"
+            cv2.putText(
+                frame,
+                label,
+                (x, y - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                (0, 255, 0),
+                2,
+            )
+            if encoder:
+                best["encoded"] = encoder.submit(encode_best_frame, frame)
+            else:
+                best["image"] = frame
+
+        if encoder:
+            # Queued encodes still run; callers wait on the futures they need
+            encoder.shutdown(wait=False)
+
     def get_video_info(self, video_path: str) -> Optional[Dict]:
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
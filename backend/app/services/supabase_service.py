@@ -1,24 +1,146 @@
-from typing import Optional, List, Dict, Any
-from uuid import UUID
-from supabase import create_client, Client
+from typing import Optional, List, Dict, Any, Tuple
+from uuid import UUID, uuid4
+from collections import OrderedDict
+from pathlib import Path
+import json
+import os
+import threading
+import time
+import httpx
+import numpy as np
+from supabase import create_client, Client, ClientOptions
 from ..config import settings
 
 
+def _quote_filter_value(value: str) -> str:
+    """Quote a value for a PostgREST or_() filter, where , . : ( ) are reserved."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+# Profile columns the student endpoints return; leaves out the embeddings
+# JSONB and template, by far the largest part of a profile row
+STUDENT_PROFILE_COLUMNS = (
+    "id, student_id, name, created_at, enrollment_status, photo_urls"
+)
+
+# Unique constraints on profiles (see schema.sql) reported by create_enrollment
+STUDENT_ID_CONSTRAINT = "profiles_student_id_key"
+NORMALIZED_NAME_CONSTRAINT = "idx_profiles_active_normalized_name"
+
+
+def encode_template(template: np.ndarray) -> str:
+    """A normalized (1, 128) template as PostgREST bytea input (hex).
+
+    Stored as int8 scaled to its largest component, 128 bytes instead of 512;
+    decode_template re-normalizes, and the rounding moves cosine similarities
+    by a few thousandths, well inside the recognition threshold margin.
+    """
+    template = np.asarray(template, dtype=np.float32)
+    peak = float(np.abs(template).max()) or 1.0
+    quantized = np.round(template * (127.0 / peak)).astype(np.int8)
+    return "\\x" + quantized.tobytes().hex()
+
+
+def decode_template(value: str) -> np.ndarray:
+    """Inverse of encode_template as a normalized float32 (1, 128) row.
+
+    PostgREST returns bytea as a \\x hex string. 512-byte values are float32
+    templates written before they were quantized.
+    """
+    raw = bytes.fromhex(value[2:])
+    if len(raw) == 128 * 4:
+        return np.frombuffer(raw, dtype=np.float32).reshape(1, -1)
+    template = np.frombuffer(raw, dtype=np.int8).astype(np.float32).reshape(1, -1)
+    norm = np.linalg.norm(template)
+    if norm > 0:
+        template /= norm
+    return template
+
+
+class EnrollmentConflictError(Exception):
+    """Raised when an enrollment violates a uniqueness constraint."""
+
+    def __init__(self, duplicate_id: bool, duplicate_name: bool):
+        super().__init__("Enrollment conflicts with an existing profile")
+        self.duplicate_id = duplicate_id
+        self.duplicate_name = duplicate_name
+
+
+def normalize_embeddings(embeddings: Optional[List[List[float]]]) -> np.ndarray:
+    """Stored embeddings as an L2-normalized (k, 128) float32 matrix."""
+    if not embeddings:
+        return np.empty((0, 128), dtype=np.float32)
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def embedding_template(normalized: np.ndarray) -> np.ndarray:
+    """Collapse a student's normalized embeddings into one (1, 128) template:
+    the re-normalized mean. Enrollment photos are near-duplicates, so one
+    row per student keeps matching accuracy at a fraction of the rows."""
+    if len(normalized) <= 1:
+        return normalized
+    template = normalized.mean(axis=0, keepdims=True)
+    norm = np.linalg.norm(template)
+    if norm > 0:
+        template /= norm
+    return template
+
+
 class SupabaseService:
+    # Courses kept in the recognition cache; least recently used go first
+    RECOGNITION_CACHE_MAX_COURSES = 128
+    # Rows per attendance_records insert request
+    ATTENDANCE_INSERT_BATCH = 1000
+
     def __init__(self):
         self.client: Optional[Client] = None
+        # One pooled HTTP/2 client shared by PostgREST and Storage requests
+        self._http: Optional[httpx.Client] = None
         self._initialized = False
+        self._init_lock = threading.Lock()
+        # course_id -> (fetched_at, embeddings version, students), in LRU order
+        self._recognition_cache: OrderedDict = OrderedDict()
+        self._recognition_cache_lock = threading.Lock()
 
     def initialize(self) -> bool:
-        try:
-            self.client = create_client(
-                settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY
-            )
-            self._initialized = True
-            return True
-        except Exception as e:
-            print(f"Failed to initialize Supabase: {e}")
-            return False
+        with self._init_lock:
+            if self._initialized:
+                return True
+            try:
+                self._http = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_connections=20, max_keepalive_connections=10
+                    ),
+                    timeout=30,
+                )
+                self.client = create_client(
+                    settings.SUPABASE_URL,
+                    settings.SUPABASE_SERVICE_KEY,
+                    options=ClientOptions(
+                        httpx_client=self._http,
+                        postgrest_client_timeout=30,
+                        storage_client_timeout=30,
+                    ),
+                )
+                self._initialized = True
+                return True
+            except Exception as e:
+                print(f"Failed to initialize Supabase: {e}")
+                return False
+
+    def close(self) -> None:
+        with self._init_lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+            self.client = None
+            self._initialized = False
 
     def is_initialized(self) -> bool:
         return self._initialized
@@ -31,34 +153,31 @@ class SupabaseService:
         """Check if a student_id or name is already taken in profiles."""
         result = {"exists": False, "duplicate_id": False, "duplicate_name": False}
 
-        # Check student_id
-        id_response = (
+        # One indexed lookup for both: student_id, or the name_normalized
+        # column (same trim/lowercase/collapse-whitespace normalization)
+        # among actively enrolled profiles, mirroring the unique constraints
+        # create_enrollment runs into
+        student_id = student_id.strip()
+        normalized_name = " ".join(student_name.strip().lower().split())
+        response = (
             self.client.table("profiles")
-            .select("id")
-            .eq("student_id", student_id.strip())
+            .select("student_id,name_normalized")
+            .or_(
+                f"student_id.eq.{_quote_filter_value(student_id)},"
+                f"and(name_normalized.eq.{_quote_filter_value(normalized_name)},"
+                "enrollment_status.eq.active)"
+            )
             .execute()
         )
-        if id_response.data:
+
+        # At most one row per matching profile, and student_id is unique
+        rows = response.data or []
+        if any(row.get("student_id") == student_id for row in rows):
             result["exists"] = True
             result["duplicate_id"] = True
-            return result
-
-        # Check name (normalized comparison)
-        normalized_name = " ".join(student_name.strip().lower().split())
-        all_profiles = (
-            self.client.table("profiles")
-            .select("name")
-            .not_.is_("name", "null")
-            .execute()
-        )
-        for profile in all_profiles.data or []:
-            existing_name = profile.get("name", "")
-            if existing_name:
-                normalized_existing = " ".join(existing_name.strip().lower().split())
-                if normalized_existing == normalized_name:
-                    result["exists"] = True
-                    result["duplicate_name"] = True
-                    return result
+        elif rows:
+            result["exists"] = True
+            result["duplicate_name"] = True
 
         return result
 
@@ -70,7 +189,11 @@ class SupabaseService:
         embeddings: List[List[float]],
         photo_urls: List[str],
     ) -> bool:
-        """Update a profile row with face enrollment data."""
+        """Update a profile row with face enrollment data.
+
+        Raises EnrollmentConflictError when the student_id or normalized
+        name is already taken (unique constraint violation).
+        """
         try:
             if not user_id or not user_id.strip():
                 print("Failed to create enrollment: user_id is required")
@@ -83,6 +206,15 @@ class SupabaseService:
                         "student_id": student_id.strip(),
                         "name": student_name.strip(),
                         "embeddings": embeddings,
+                        # Precomputed here so recognition reads 128 bytes
+                        # instead of parsing every stored embedding
+                        "embedding_template": (
+                            encode_template(
+                                embedding_template(normalize_embeddings(embeddings))
+                            )
+                            if embeddings
+                            else None
+                        ),
                         "photo_urls": photo_urls,
                         "enrollment_status": "active",
                     }
@@ -95,61 +227,68 @@ class SupabaseService:
                 return True
             return False
         except Exception as e:
+            if getattr(e, "code", None) == "23505":
+                # Match the violated constraint, named in the message; the
+                # details echo the conflicting value, which can be anything
+                message = getattr(e, "message", None) or ""
+                raise EnrollmentConflictError(
+                    duplicate_id=STUDENT_ID_CONSTRAINT in message,
+                    duplicate_name=NORMALIZED_NAME_CONSTRAINT in message,
+                ) from e
             print(f"[ERROR] Failed to create enrollment: {e}")
             print(f"[DEBUG] user_id={user_id}, student_id={student_id}")
             import traceback
             traceback.print_exc()
             return False
 
-    def get_enrollments(self, course_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get enrolled students (profiles with active enrollment_status)."""
+    def get_enrollments(
+        self,
+        course_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Get a page of enrolled students and the total count, paginated in the database."""
         try:
             if course_id:
-                # Get user_ids enrolled in this course
-                course_students = (
-                    self.client.table("course_enrollments")
-                    .select("user_id")
-                    .eq("course_id", course_id)
-                    .eq("status", "active")
-                    .execute()
-                )
-                user_ids = [cs["user_id"] for cs in course_students.data or []]
-
-                if not user_ids:
-                    return []
-
-                profiles = []
-                for uid in user_ids:
-                    response = (
-                        self.client.table("profiles")
-                        .select("*")
-                        .eq("id", uid)
-                        .eq("enrollment_status", "active")
-                        .execute()
+                # Inner-joined course_enrollments restricts profiles to the
+                # course's active members in the same request
+                query = (
+                    self.client.table("profiles")
+                    .select(
+                        f"{STUDENT_PROFILE_COLUMNS}, "
+                        "course_enrollments!inner(course_id)",
+                        count="exact",
                     )
-                    if response.data:
-                        profiles.extend(response.data)
-                return profiles
+                    .eq("enrollment_status", "active")
+                    .eq("course_enrollments.course_id", course_id)
+                    .eq("course_enrollments.status", "active")
+                )
             else:
-                response = (
+                query = (
                     self.client.table("profiles")
-                    .select("*")
+                    .select(STUDENT_PROFILE_COLUMNS, count="exact")
                     .eq("enrollment_status", "active")
                     .eq("role", "student")
-                    .order("created_at", desc=True)
-                    .execute()
                 )
-                return response.data or []
+
+            query = query.order("created_at", desc=True)
+            if limit is not None:
+                query = query.range(offset, offset + limit - 1)
+
+            response = query.execute()
+            rows = response.data or []
+            total = response.count if response.count is not None else len(rows)
+            return rows, total
         except Exception as e:
             print(f"Failed to get enrollments: {e}")
-            return []
+            return [], 0
 
     def get_enrollment(self, profile_id: str) -> Optional[Dict[str, Any]]:
         """Get a single enrolled student profile."""
         try:
             response = (
                 self.client.table("profiles")
-                .select("*")
+                .select(STUDENT_PROFILE_COLUMNS)
                 .eq("id", profile_id)
                 .single()
                 .execute()
@@ -181,6 +320,7 @@ class SupabaseService:
                 {
                     "enrollment_status": "deleted",
                     "embeddings": None,
+                    "embedding_template": None,
                     "photo_urls": None,
                 }
             ).eq("id", profile_id).execute()
@@ -192,31 +332,232 @@ class SupabaseService:
     def get_enrolled_students_for_recognition(
         self, course_id: str
     ) -> List[Dict[str, Any]]:
-        """Get students enrolled in a course with their face embeddings."""
+        """Get students enrolled in a course with their face embeddings.
+
+        Cached for up to the TTL, but only while the course's
+        course_embeddings_version is unchanged; the version is read on every
+        call so enrollments made elsewhere (e.g. from the frontend) show up
+        on the next attendance run.
+        """
+        ttl = settings.RECOGNITION_CACHE_TTL_SECONDS
+        now = time.monotonic()
+        version = self._course_embeddings_version(course_id)
+
+        with self._recognition_cache_lock:
+            cached = self._recognition_cache.get(course_id)
+            if cached and version is not None:
+                fetched_at, cached_version, students = cached
+                if cached_version == version and now - fetched_at < ttl:
+                    self._recognition_cache.move_to_end(course_id)
+                    return students
+            if cached:
+                del self._recognition_cache[course_id]
+
+        students = self._fetch_enrolled_students_for_recognition(course_id, version)
+        if students and ttl > 0 and version is not None:
+            with self._recognition_cache_lock:
+                self._recognition_cache[course_id] = (now, version, students)
+                self._recognition_cache.move_to_end(course_id)
+                while len(self._recognition_cache) > self.RECOGNITION_CACHE_MAX_COURSES:
+                    self._recognition_cache.popitem(last=False)
+        return students
+
+    def invalidate_recognition_cache(
+        self, course_id: Optional[str] = None, user_id: Optional[str] = None
+    ) -> None:
+        """Drop cached recognition data for one course, for every course that
+        includes a user, or (with no arguments) for all courses.
+
+        Reads already discard entries whose course_embeddings_version has
+        moved on (which also covers students joining a course); this only
+        frees them early after changes made through this backend.
+        """
+        with self._recognition_cache_lock:
+            if course_id is not None:
+                self._recognition_cache.pop(course_id, None)
+            elif user_id is not None:
+                stale = [
+                    cid
+                    for cid, (_, _, students) in self._recognition_cache.items()
+                    if any(s.get("user_id") == user_id for s in students)
+                ]
+                for cid in stale:
+                    del self._recognition_cache[cid]
+            else:
+                self._recognition_cache.clear()
+
+    def _course_embeddings_version(self, course_id: str) -> Optional[int]:
+        """Current course_embeddings_version (0 if never bumped), or None if
+        it cannot be read, in which case the on-disk copy is not trusted."""
+        try:
+            response = (
+                self.client.table("course_embeddings_version")
+                .select("version")
+                .eq("course_id", course_id)
+                .execute()
+            )
+            return response.data[0]["version"] if response.data else 0
+        except Exception as e:
+            print(f"Failed to get course embeddings version: {e}")
+            return None
+
+    @staticmethod
+    def _course_embeddings_paths(course_id: str) -> Tuple[Path, Path]:
+        embeddings_dir = Path(settings.LOCAL_EMBEDDINGS_PATH)
+        return (
+            embeddings_dir / f"students_{course_id}.json",
+            embeddings_dir / f"embeddings_{course_id}",
+        )
+
+    def dump_course_embeddings(
+        self, course_id: str, students: List[Dict[str, Any]], version: int
+    ) -> None:
+        """Write a course's recognition students as one contiguous (N, 128)
+        float32 .npy plus a sidecar JSON with each student's row range.
+
+        The matrix file name carries the version and the sidecar is swapped
+        in last, so readers never pair a sidecar with the wrong matrix.
+        """
+        sidecar_path, matrix_stem = self._course_embeddings_paths(course_id)
+        sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+
+        blocks, meta, row = [], [], 0
+        for student in students:
+            block = student["embeddings"]
+            blocks.append(block)
+            meta.append(
+                {
+                    **{k: v for k, v in student.items() if k != "embeddings"},
+                    "rows": [row, row + len(block)],
+                }
+            )
+            row += len(block)
+        matrix = (
+            np.vstack(blocks).astype(np.float32, copy=False)
+            if blocks
+            else np.empty((0, 128), dtype=np.float32)
+        )
+
+        # Temp names are unique per writer: workers (or threads) that miss the
+        # same course at once must not write into each other's file
+        tmp_suffix = f".{uuid4().hex}.tmp"
+        matrix_path = matrix_stem.with_name(f"{matrix_stem.name}_v{version}.npy")
+        tmp_matrix = matrix_path.with_name(matrix_path.name + tmp_suffix)
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_matrix, matrix_path)
+
+        previous = None
+        if sidecar_path.exists():
+            with open(sidecar_path) as f:
+                previous = json.load(f).get("matrix")
+
+        tmp_sidecar = sidecar_path.with_name(sidecar_path.name + tmp_suffix)
+        with open(tmp_sidecar, "w") as f:
+            json.dump(
+                {"version": version, "matrix": matrix_path.name, "students": meta}, f
+            )
+        os.replace(tmp_sidecar, sidecar_path)
+
+        # Readers that already mapped the old matrix keep their mapping
+        if previous and previous != matrix_path.name:
+            (sidecar_path.parent / previous).unlink(missing_ok=True)
+
+    def load_course_embeddings(
+        self, course_id: str, version: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Students from dump_course_embeddings if it is at `version`; each
+        student's "embeddings" is a zero-copy view of the memory-mapped matrix."""
+        sidecar_path, _ = self._course_embeddings_paths(course_id)
+        try:
+            with open(sidecar_path) as f:
+                sidecar = json.load(f)
+            if sidecar.get("version") != version:
+                return None
+            matrix = np.load(sidecar_path.parent / sidecar["matrix"], mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+
+        students = []
+        for student in sidecar["students"]:
+            start, stop = student.pop("rows")
+            student["embeddings"] = matrix[start:stop]
+            students.append(student)
+        return students
+
+    def _fetch_enrolled_students_for_recognition(
+        self, course_id: str, version: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        # The version is read before the fetch below: a change during it then
+        # leaves the dump tagged with the older version, so it is refreshed
+        # next time
+        if version is not None:
+            students = self.load_course_embeddings(course_id, version)
+            if students is not None:
+                return students
+
+        students = self._fetch_students_from_database(course_id)
+        if students and version is not None:
+            try:
+                self.dump_course_embeddings(course_id, students, version)
+            except Exception as e:
+                print(f"Failed to save course embeddings: {e}")
+        return students
+
+    def _fetch_students_from_database(self, course_id: str) -> List[Dict[str, Any]]:
         try:
-            course_enrollments = (
+            # One request: course members with their profiles embedded
+            # (course_enrollments.user_id -> profiles.id), inner-joined so
+            # only active enrollments come back. Only the precomputed
+            # template is transferred, not the per-photo embeddings.
+            response = (
                 self.client.table("course_enrollments")
-                .select("user_id")
+                .select(
+                    "user_id, profiles!inner(id, student_id, name, embedding_template)"
+                )
                 .eq("course_id", course_id)
                 .eq("status", "active")
+                .eq("profiles.enrollment_status", "active")
                 .execute()
             )
+            profiles = [
+                row["profiles"] for row in response.data or [] if row.get("profiles")
+            ]
+
+            # Profiles enrolled before templates were stored: build theirs
+            # from the raw embeddings, fetched in one extra request
+            legacy_ids = [p["id"] for p in profiles if not p.get("embedding_template")]
+            legacy_embeddings = {}
+            if legacy_ids:
+                legacy = (
+                    self.client.table("profiles")
+                    .select("id, embeddings")
+                    .in_("id", legacy_ids)
+                    .execute()
+                )
+                legacy_embeddings = {
+                    p["id"]: p.get("embeddings") for p in legacy.data or []
+                }
 
             students = []
-            for ce in course_enrollments.data or []:
-                user_id = ce.get("user_id")
-                if user_id:
-                    profile = self.get_enrollment_by_user(user_id)
-                    if profile:
-                        students.append(
-                            {
-                                "id": profile["id"],
-                                "user_id": profile["id"],
-                                "student_id": profile.get("student_id"),
-                                "student_name": profile.get("name"),
-                                "embeddings": profile.get("embeddings", []),
-                            }
-                        )
+            for profile in profiles:
+                if profile.get("embedding_template"):
+                    template = decode_template(profile["embedding_template"])
+                else:
+                    template = embedding_template(
+                        normalize_embeddings(legacy_embeddings.get(profile["id"]))
+                    )
+                students.append(
+                    {
+                        "id": profile["id"],
+                        "user_id": profile["id"],
+                        "student_id": profile.get("student_id"),
+                        "student_name": profile.get("name"),
+                        # One normalized (1, 128) row per student, so matching
+                        # is a plain dot product
+                        "embeddings": template,
+                    }
+                )
 
             return students
         except Exception as e:
@@ -271,8 +612,9 @@ class SupabaseService:
         frames_total: int,
         best_frame_path: Optional[str] = None,
     ) -> bool:
-        try:
-            self.client.table("attendance_records").insert(
+        """Insert one record; prefer bulk_create_attendance_records for a session."""
+        return self.bulk_create_attendance_records(
+            [
                 {
                     "session_id": session_id,
                     "user_id": user_id,
@@ -284,10 +626,21 @@ class SupabaseService:
                     "frames_total": frames_total,
                     "best_frame_path": best_frame_path,
                 }
-            ).execute()
+            ]
+        )
+
+    def bulk_create_attendance_records(self, records: List[Dict[str, Any]]) -> bool:
+        """Insert all attendance records of a session, one request per
+        ATTENDANCE_INSERT_BATCH rows."""
+        if not records:
+            return True
+        try:
+            for start in range(0, len(records), self.ATTENDANCE_INSERT_BATCH):
+                batch = records[start : start + self.ATTENDANCE_INSERT_BATCH]
+                self.client.table("attendance_records").insert(batch).execute()
             return True
         except Exception as e:
-            print(f"Failed to create attendance record: {e}")
+            print(f"Failed to create attendance records: {e}")
             return False
 
     def get_attendance_session(self, session_id: str) -> Optional[Dict[str, Any]]:
@@ -304,13 +657,17 @@ class SupabaseService:
             print(f"Failed to get attendance session: {e}")
             return None
 
-    def get_attendance_records(self, session_id: str) -> List[Dict[str, Any]]:
+    def get_attendance_records(
+        self, session_id: str, limit: int = 100, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Get a page of a session's attendance records, by student name."""
         try:
             response = (
                 self.client.table("attendance_records")
                 .select("*")
                 .eq("session_id", session_id)
                 .order("student_name")
+                .range(offset, offset + limit - 1)
                 .execute()
             )
             return response.data or []
@@ -318,15 +675,33 @@ class SupabaseService:
             print(f"Failed to get attendance records: {e}")
             return []
 
+    def get_session_with_records(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get a session with all its records embedded under
+        "attendance_records" (ordered by student name), in one request."""
+        try:
+            response = (
+                self.client.table("attendance_sessions")
+                .select("*, attendance_records(*)")
+                .eq("id", session_id)
+                .order("student_name", foreign_table="attendance_records")
+                .single()
+                .execute()
+            )
+            return response.data
+        except Exception as e:
+            print(f"Failed to get attendance session: {e}")
+            return None
+
     def get_attendance_history(
         self,
         course_id: Optional[str] = None,
         teacher_id: Optional[str] = None,
         limit: int = 20,
         offset: int = 0,
-    ) -> List[Dict[str, Any]]:
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Get a page of attendance sessions and the total count."""
         try:
-            query = self.client.table("attendance_sessions").select("*")
+            query = self.client.table("attendance_sessions").select("*", count="exact")
 
             if course_id:
                 query = query.eq("course_id", course_id)
@@ -338,10 +713,12 @@ class SupabaseService:
                 .range(offset, offset + limit - 1)
                 .execute()
             )
-            return response.data or []
+            rows = response.data or []
+            total = response.count if response.count is not None else len(rows)
+            return rows, total
         except Exception as e:
             print(f"Failed to get attendance history: {e}")
-            return []
+            return [], 0
 
     # ── Storage Methods ───────────────────────────────────────────
 
@@ -362,6 +739,16 @@ class SupabaseService:
             print(f"Failed to upload photo: {e}")
             return None
 
+    def delete_photos(self, file_paths: List[str]) -> bool:
+        """Remove uploaded photos, e.g. those of a rejected enrollment."""
+        try:
+            bucket = self.client.storage.from_(settings.SUPABASE_BUCKET)
+            bucket.remove(file_paths)
+            return True
+        except Exception as e:
+            print(f"Failed to delete photos: {e}")
+            return False
+
 
 supabase_service = SupabaseService()
 
@@ -1,12 +1,18 @@
 """
-Backend API for face enrollment operations
+Backend API for face enrollment operations and video processing
 """
 
+import base64
 import json
+import os
+import tempfile
+import threading
 from pathlib import Path
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 
+from detector import YuNetDetector, STUDENTS_FILE
+
 app = Flask(__name__)
 CORS(app)
 
@@ -17,14 +23,46 @@ METADATA_DIR = DATA_DIR / "metadata"
 
 
 def load_embeddings():
-    """Load embeddings from JSON file"""
-    embeddings_file = EMBEDDINGS_DIR / "embeddings.json"
-    if embeddings_file.exists():
-        with open(embeddings_file, "r") as f:
-            return json.load(f)
+    """Load enrolled students (names/ids only) from the embeddings index"""
+    for embeddings_file in (EMBEDDINGS_DIR / "students.json", EMBEDDINGS_DIR / "embeddings.json"):
+        if embeddings_file.exists():
+            with open(embeddings_file, "r") as f:
+                return json.load(f)
     return {"students": {}}
 
 
+# One detector per process, shared by all requests (models load once)
+_detector = None
+_detector_lock = threading.Lock()
+_embeddings_cache = {"mtime": None, "data": None}
+_embeddings_lock = threading.Lock()
+
+
+def get_detector():
+    """Lazily create the shared YuNet + SFace detector"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            detector = YuNetDetector()
+            if not detector.initialize() or not detector.initialize_sface():
+                return None
+            _detector = detector
+        return _detector
+
+
+def get_recognition_embeddings(detector):
+    """Enrolled embeddings, reloaded only when the embeddings index changes"""
+    try:
+        mtime = STUDENTS_FILE.stat().st_mtime
+    except FileNotFoundError:
+        mtime = 0.0
+    with _embeddings_lock:
+        if _embeddings_cache["mtime"] != mtime:
+            _embeddings_cache["data"] = detector.load_embeddings()
+            _embeddings_cache["mtime"] = mtime
+        return _embeddings_cache["data"]
+
+
 def load_metadata():
     """Load student metadata from JSON file"""
     metadata_file = METADATA_DIR / "student_info.json"
@@ -99,5 +137,43 @@ def check_enrollment():
     return jsonify({"exists": False, "message": "Student ID and name are available"})
 
 
+@app.route("/api/process-video", methods=["POST"])
+def process_video():
+    """Detect and recognize faces in an uploaded video"""
+    video = request.files.get("video")
+    if video is None or not video.filename:
+        return jsonify({"error": "Please upload a video file"}), 400
+
+    frame_stride = request.form.get("frame_stride", 5, type=int)
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(video.filename).suffix) as f:
+        video.save(f)
+        video_path = f.name
+
+    try:
+        # The detector is thread-safe (per-thread buffers, a lock per network):
+        # concurrent requests overlap, serialized only around each network call
+        detector = get_detector()
+        if detector is None:
+            return jsonify({"error": "Failed to load face models"}), 500
+
+        results = detector.process_video_with_recognition(
+            video_path,
+            embeddings_data=get_recognition_embeddings(detector),
+            frame_stride=frame_stride,
+        )
+    finally:
+        os.remove(video_path)
+
+    if results is None:
+        return jsonify({"error": "Could not open video"}), 400
+
+    # JPEG thumbnails -> base64 so the results are plain JSON
+    for frame in results["best_frames"].values():
+        frame["image"] = base64.b64encode(frame["image"]).decode("ascii")
+
+    return jsonify(results)
+
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
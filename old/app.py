@@ -3,8 +3,118 @@ Face Detection & Recognition App with Streamlit
 Video upload UI - Process video, detect faces, and show recognized student names
 """
 
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 import streamlit as st
-from detector import YuNetDetector
+from pathlib import Path
+from detector import YuNetDetector, STUDENTS_FILE, cuda_available, ort_cuda_available, get_dnn_backend
+
+METADATA_FILE = Path("data/metadata/student_info.json")
+
+
+@st.cache_resource(show_spinner="Loading models...")
+def get_detector(backend_id: int, target_id: int, use_onnxruntime: bool = False) -> YuNetDetector:
+    """Singleton detector per backend, shared across reruns and sessions"""
+    detector = YuNetDetector()
+    detector.initialize(backend_id=backend_id, target_id=target_id)
+    detector.initialize_sface(use_onnxruntime=use_onnxruntime)
+    return detector
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_embeddings_cached(mtime: float, _detector: YuNetDetector):
+    """Enrolled embeddings, re-read only when the embeddings file changes.
+    Shared as-is (never copied), so callers must treat it as read-only"""
+    return _detector.load_embeddings()
+
+
+@st.cache_data(show_spinner=False)
+def enrolled_student_names(mtime: float, _embeddings) -> dict:
+    """student_id -> display name (stripped), recomputed only when the embeddings file changes"""
+    if not _embeddings:
+        return {}
+    return {sid: s["name"].strip() for sid, s in _embeddings.get("students", {}).items()}
+
+
+@st.cache_data(show_spinner=False)
+def load_student_metadata(mtime: float) -> dict:
+    """Enrollment metadata, re-read only when the metadata file changes"""
+    if not mtime:
+        return {}
+    with open(METADATA_FILE, 'r') as f:
+        return json.load(f)
+
+
+def file_mtime(path: Path) -> float:
+    """Modification time of a file (0 if missing)"""
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def embeddings_mtime() -> float:
+    """Modification time of the embeddings index (0 if missing)"""
+    return file_mtime(STUDENTS_FILE)
+
+
+@st.cache_resource
+def temp_video_registry() -> set:
+    """Process-wide set of staged temp videos, removed at interpreter exit"""
+    paths = set()
+    atexit.register(lambda: [remove_temp_video(p) for p in list(paths)])
+    return paths
+
+
+def remove_temp_video(path: str):
+    """Delete a staged temp video (ignores files that are already gone)"""
+    temp_video_registry().discard(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard_staged_video():
+    """Delete this session's staged temp video, if any"""
+    staged = st.session_state.pop('temp_video', None)
+    if staged:
+        remove_temp_video(staged['path'])
+
+
+def stage_uploaded_video(uploaded_file) -> str:
+    """
+    Write an upload to a temp file, streaming 1 MiB chunks instead of
+    materializing it in memory. Reruns with the same upload reuse the file.
+    """
+    digest = hashlib.blake2b()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+        digest.update(chunk)
+    upload_hash = digest.hexdigest()
+    
+    staged = st.session_state.get('temp_video')
+    if staged and staged['hash'] == upload_hash and os.path.exists(staged['path']):
+        return staged['path']
+    
+    discard_staged_video()
+    
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as f:
+        try:
+            shutil.copyfileobj(uploaded_file, f, 1024 * 1024)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    
+    temp_video_registry().add(f.name)
+    st.session_state.temp_video = {'hash': upload_hash, 'path': f.name}
+    return f.name
 
 
 def main():
@@ -17,16 +127,25 @@ def main():
         layout="wide"
     )
     
-    # Initialize detector
-    if 'detector' not in st.session_state:
-        with st.spinner("Loading models..."):
-            st.session_state.detector = YuNetDetector()
-            st.session_state.detector_initialized = st.session_state.detector.initialize()
-            st.session_state.detector.initialize_sface()
-            st.session_state.embeddings = st.session_state.detector.load_embeddings()
+    # Inference backend (persisted in session_state via the widget key)
+    has_cuda = cuda_available() or ort_cuda_available()
+    use_cuda = st.sidebar.checkbox(
+        "Use GPU (CUDA)",
+        value=has_cuda,
+        key="use_cuda",
+        disabled=not has_cuda,
+        help="Run YuNet + SFace on the GPU (OpenCV CUDA backend or onnxruntime)" if has_cuda
+             else "No CUDA device / CUDA-enabled OpenCV or onnxruntime build found"
+    )
     
-    detector = st.session_state.detector
-    embeddings = st.session_state.embeddings
+    # Cached detector + embeddings (no model reload on reruns)
+    detector = get_detector(
+        *get_dnn_backend(use_cuda),
+        use_onnxruntime=use_cuda and not cuda_available() and ort_cuda_available()
+    )
+    mtime = embeddings_mtime()
+    embeddings = load_embeddings_cached(mtime, detector)
+    student_names = enrolled_student_names(mtime, embeddings)
     
     # Title
     st.title("😊 Face Detection & Recognition")
@@ -35,23 +154,16 @@ def main():
     # Show enrollment status with management dropdown
     if embeddings and embeddings.get("students"):
         num_students = len(embeddings["students"])
-        student_names = [s["name"].strip() for s in embeddings["students"].values()]
-        st.success(f"✅ {num_students} enrolled student(s): **{', '.join(student_names)}**")
+        st.success(f"✅ {num_students} enrolled student(s): **{', '.join(student_names.values())}**")
         
         # Load metadata for enrollment dates
-        from pathlib import Path
-        metadata_file = Path("data/metadata/student_info.json")
-        metadata = {}
-        if metadata_file.exists():
-            import json
-            with open(metadata_file, 'r') as f:
-                metadata = json.load(f)
+        metadata = load_student_metadata(file_mtime(METADATA_FILE))
         
         with st.expander("👥 Manage Enrolled Students", expanded=False):
-            for sid, sdata in list(embeddings["students"].items()):
+            for sid, name in student_names.items():
                 col_name, col_id, col_date, col_btn = st.columns([3, 1, 2, 1])
                 with col_name:
-                    st.write(f"**{sdata['name'].strip()}**")
+                    st.write(f"**{name}**")
                 with col_id:
                     st.write(f"ID: {sid}")
                 with col_date:
@@ -61,9 +173,8 @@ def main():
                     if st.button("🗑️ Remove", key=f"del_{sid}"):
                         success = detector.delete_student(sid)
                         if success:
-                            # Refresh cached embeddings
-                            st.session_state.embeddings = detector.load_embeddings()
-                            st.success(f"Removed {sdata['name'].strip()}")
+                            # Embeddings file mtime changed, so the cache refreshes on rerun
+                            st.success(f"Removed {name}")
                             st.rerun()
                         else:
                             st.error(f"Failed to remove student {sid}")
@@ -80,10 +191,8 @@ def main():
     )
     
     if uploaded_file is not None:
-        # Save uploaded file temporarily
-        temp_video_path = f"temp_video.{uploaded_file.name.split('.')[-1]}"
-        with open(temp_video_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        # Save uploaded file temporarily (reused across reruns for the same upload)
+        temp_video_path = stage_uploaded_video(uploaded_file)
         
         # Get video info
         with st.spinner("Analyzing video..."):
@@ -102,12 +211,28 @@ def main():
         
         # Process button
         st.subheader("🚀 Process Video")
+        frame_stride = st.slider(
+            "Processing quality (analyze every Nth frame)",
+            min_value=1,
+            max_value=10,
+            value=5,
+            help="1 analyzes every frame (slowest). Students appear across many frames, "
+                 "so skipping frames barely affects attendance."
+        )
         if st.button("Detect & Recognize Faces", type="primary"):
             # Progress bar
             progress_bar = st.progress(0)
             status_text = st.empty()
             
+            last_step = -1
+            
             def update_progress(progress):
+                # ~50 UI updates per video at most
+                nonlocal last_step
+                step = int(progress * 50)
+                if step == last_step:
+                    return
+                last_step = step
                 progress_bar.progress(progress)
                 status_text.text(f"Processing... {int(progress * 100)}%")
             
@@ -116,14 +241,20 @@ def main():
                 results = detector.process_video_with_recognition(
                     temp_video_path,
                     embeddings_data=embeddings,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    frame_stride=frame_stride
                 )
             
             progress_bar.progress(1.0)
             status_text.text("✓ Processing complete!")
             
-            # Store results in session state so they persist across reruns
+            # Store results in session state so they persist across reruns,
+            # along with the attendance list sorted once (most frames first)
             st.session_state.results = results
+            recognized = (results or {}).get('recognized_students', {})
+            st.session_state.sorted_attendance = sorted(
+                recognized.items(), key=lambda x: x[1]['frames_appeared'], reverse=True
+            )
         
         # Display results from session state (persists when dropdown changes)
         if 'results' in st.session_state and st.session_state.results:
@@ -153,7 +284,7 @@ def main():
                 st.write(f"**{len(recognized)}** student(s) recognized across **{frames_processed}** frames:")
                 st.write("")
                 
-                for sid, info in sorted(recognized.items(), key=lambda x: x[1]['frames_appeared'], reverse=True):
+                for sid, info in st.session_state.get('sorted_attendance', recognized.items()):
                     appeared = info['frames_appeared']
                     confidence = appeared / frames_processed if frames_processed > 0 else 0
                     
@@ -170,11 +301,8 @@ def main():
                 st.divider()
                 
                 # Show enrolled but NOT recognized students
-                if embeddings and embeddings.get("students"):
-                    absent = []
-                    for sid, sdata in embeddings["students"].items():
-                        if sid not in recognized:
-                            absent.append(sdata["name"].strip())
+                if student_names:
+                    absent = [name for sid, name in student_names.items() if sid not in recognized]
                     if absent:
                         st.write("**❌ Not detected (absent):**")
                         for name in absent:
@@ -218,6 +346,7 @@ def main():
                 st.info("No faces were recognized in the video.")
     
     else:
+        discard_staged_video()
         st.info("👆 Upload a video file to begin face detection & recognition")
 
 
@@ -4,55 +4,372 @@ Handles all face detection and recognition logic
 """
 
 import cv2
+import hashlib
+import httpx
 import json
+import os
+import queue
+import threading
+import time
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Tuple, Optional, Dict, List, Callable
 
+try:
+    # Optional: runs SFace on the GPU when OpenCV itself has no CUDA build
+    import onnx
+    import onnxruntime as ort
+except ImportError:
+    onnx = ort = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: downloads are not serialized across processes
+    fcntl = None
+
+
+# Shared by every process on the machine, so models are downloaded once
+MODEL_DIR = Path(os.environ.get("YUNET_MODEL_DIR", Path.home() / ".cache" / "yunet"))
+
+EMBEDDINGS_DIR = Path("data/embeddings")
+EMBEDDINGS_MATRIX_FILE = EMBEDDINGS_DIR / "embeddings.npy"  # matrix of stores from before versioning
+STUDENTS_FILE = EMBEDDINGS_DIR / "students.json"            # metadata, matrix file name + row ranges
+EMBEDDINGS_FILE = EMBEDDINGS_DIR / "embeddings.json"        # legacy JSON store (migrated on load)
+
+def cuda_available() -> bool:
+    """Check whether OpenCV was built with CUDA and a CUDA device is present"""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except Exception:
+        return False
+
+
+def get_dnn_backend(use_cuda: bool = True) -> Tuple[int, int]:
+    """Return (backend_id, target_id) for OpenCV DNN models"""
+    if use_cuda and cuda_available():
+        return cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16
+    return cv2.dnn.DNN_BACKEND_DEFAULT, cv2.dnn.DNN_TARGET_CPU
+
+
+def ort_cuda_available() -> bool:
+    """Check whether onnxruntime (with onnx) can run models on CUDA"""
+    return ort is not None and "CUDAExecutionProvider" in ort.get_available_providers()
+
+
+def make_batch_dynamic(src_path: Path, dst_path: Path) -> None:
+    """
+    Save a copy of an ONNX model whose batch dimension is dynamic.
+    The SFace export pins batch=1 (and lists its weights as graph inputs),
+    which onnxruntime enforces even though OpenCV DNN ignores it.
+    """
+    model = onnx.load(str(src_path))
+    initializers = {init.name for init in model.graph.initializer}
+    for graph_input in list(model.graph.input):
+        if graph_input.name in initializers:
+            model.graph.input.remove(graph_input)
+    for value in list(model.graph.input) + list(model.graph.output):
+        value.type.tensor_type.shape.dim[0].dim_param = "N"
+    model.graph.ClearField("value_info")
+    
+    tmp_path = dst_path.with_suffix(".tmp")
+    onnx.save(model, str(tmp_path))
+    os.replace(tmp_path, dst_path)
+
+
+# Model file -> (URL, SHA-256); downloads are verified against the hash
+MODEL_SOURCES = {
+    "face_detection_yunet_2023mar.onnx": (
+        "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx",
+        "8f2383e4dd3cfbb4553ea8718107fc0423210dc964f9f4280604804ed2552fa4",
+    ),
+    "face_recognition_sface_2021dec.onnx": (
+        "https://github.com/opencv/opencv_zoo/raw/main/models/face_recognition_sface/face_recognition_sface_2021dec.onnx",
+        "0ba9fbfa01b5270c96627c4ef784da859931e02f04419c829e83484087c34e79",
+    ),
+}
+
+
+def _download(url: str, dest: Path, sha256: Optional[str] = None,
+              retries: int = 3, chunk_size: int = 1 << 20) -> None:
+    """
+    Stream url to dest via dest.part, resuming a partial file left by an
+    earlier attempt. A .lock sidecar makes concurrent workers wait for the
+    first one instead of downloading (and overwriting) the same file.
+    dest only appears, by rename, once the download is complete and (with
+    sha256) verified; a corrupt download is discarded and raises ValueError.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + ".part")
+    
+    with open(dest.with_name(dest.name + ".lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if dest.exists():
+            return  # another worker finished it while we waited
+        
+        for attempt in range(retries):
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with httpx.stream("GET", url, headers=headers, follow_redirects=True, timeout=30.0) as response:
+                    if response.status_code == 416:
+                        # Stale partial file the server can't resume; start over
+                        part.unlink()
+                        continue
+                    response.raise_for_status()
+                    # 206 resumes; a plain 200 means the server ignored the range
+                    resumed = response.status_code == 206
+                    digest = hashlib.sha256()
+                    with open(part, "r+b" if resumed else "wb") as f:
+                        if resumed:
+                            # Hash what is already on disk, then append
+                            while chunk := f.read(chunk_size):
+                                digest.update(chunk)
+                        for chunk in response.iter_bytes(chunk_size):
+                            f.write(chunk)
+                            digest.update(chunk)
+                        f.flush()
+                        os.fsync(f.fileno())
+                break
+            except httpx.HTTPError:
+                if attempt == retries - 1:
+                    raise
+        else:
+            raise RuntimeError(f"Could not download {url}")
+        
+        if sha256 and digest.hexdigest() != sha256:
+            part.unlink()
+            raise ValueError(f"Checksum mismatch for {dest.name}")
+        os.replace(part, dest)
+
+
+def open_video(video_path: str) -> cv2.VideoCapture:
+    """
+    Open a video file, preferring FFmpeg with hardware-accelerated decoding
+    (NVDEC/VAAPI/...) and falling back to OpenCV's default backend.
+    """
+    try:
+        cap = cv2.VideoCapture(
+            video_path, cv2.CAP_FFMPEG,
+            [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        )
+        if cap.isOpened():
+            return cap
+        cap.release()
+    except Exception as e:
+        print(f"✗ Hardware-accelerated decoding unavailable: {e}")
+    
+    return cv2.VideoCapture(video_path)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a float32 matrix in place (zero rows stay zero)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def aligned_faces_to_blob(aligned_faces: List[np.ndarray], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Pack 112x112 BGR face crops into an (N, 3, 112, 112) float32 SFace input blob.
+    BGR->RGB, HWC->CHW and uint8->float32 happen in one write per crop, matching
+    cv2.dnn.blobFromImages(crops, 1.0, (112, 112), swapRB=True) without temporaries.
+    """
+    if out is None:
+        out = np.empty((len(aligned_faces), 3, 112, 112), dtype=np.float32)
+    
+    for i, crop in enumerate(aligned_faces):
+        out[i] = crop[:, :, ::-1].transpose(2, 0, 1)
+    
+    return out
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put onto a bounded queue; give up (False) once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Get from a queue; returns None once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+# Face label style (see draw_face_label)
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.6
+LABEL_THICKNESS = 2
+
+
+def draw_face_label(frame: np.ndarray, box, label: str, color: Tuple[int, int, int]) -> None:
+    """Draw a face box with its label on a filled background above it"""
+    x, y, w, h = box
+    cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+    (text_w, text_h), _ = cv2.getTextSize(label, LABEL_FONT, LABEL_SCALE, LABEL_THICKNESS)
+    cv2.rectangle(frame, (x, y - text_h - 10), (x + text_w, y), color, -1)
+    cv2.putText(frame, label, (x, y - 5), LABEL_FONT, LABEL_SCALE, (255, 255, 255), LABEL_THICKNESS)
+
+
+def encode_thumbnail(image: np.ndarray, max_width: int = 640, quality: int = 80) -> bytes:
+    """Downscale a BGR image to at most max_width and JPEG-encode it"""
+    height, width = image.shape[:2]
+    if width > max_width:
+        image = cv2.resize(image, (max_width, int(max_width * height / width)), interpolation=cv2.INTER_AREA)
+    
+    ok, buf = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes() if ok else b""
+
+
+def decode_yunet_outputs(outputs: Dict[str, np.ndarray], batch_index: int, pad_size: Tuple[int, int],
+                         score_threshold: float, nms_threshold: float, top_k: int) -> Optional[np.ndarray]:
+    """
+    Decode raw YuNet network outputs for one image of a batch.
+    Mirrors OpenCV's FaceDetectorYN post-processing.
+    
+    Args:
+        outputs: Output blobs keyed by layer name (cls_8, obj_8, bbox_8, kps_8, ...)
+        batch_index: Which image of the batch to decode
+        pad_size: (width, height) of the padded network input
+        
+    Returns:
+        (N, 15) array in FaceDetectorYN format or None if no faces
+    """
+    pad_w, pad_h = pad_size
+    boxes, scores, landmarks = [], [], []
+    
+    for stride in YuNetDetector.STRIDES:
+        cols, rows = pad_w // stride, pad_h // stride
+        n = cols * rows
+        rows_slice = slice(batch_index * n, (batch_index + 1) * n)
+        
+        cls = outputs[f"cls_{stride}"].reshape(-1)[rows_slice]
+        obj = outputs[f"obj_{stride}"].reshape(-1)[rows_slice]
+        bbox = outputs[f"bbox_{stride}"].reshape(-1, 4)[rows_slice]
+        kps = outputs[f"kps_{stride}"].reshape(-1, 5, 2)[rows_slice]
+        
+        idx = np.arange(n)
+        r = (idx // cols).astype(np.float32)
+        c = (idx % cols).astype(np.float32)
+        
+        cx = (c + bbox[:, 0]) * stride
+        cy = (r + bbox[:, 1]) * stride
+        w = np.exp(bbox[:, 2]) * stride
+        h = np.exp(bbox[:, 3]) * stride
+        boxes.append(np.stack([cx - w / 2, cy - h / 2, w, h], axis=1))
+        
+        kx = (kps[:, :, 0] + c[:, None]) * stride
+        ky = (kps[:, :, 1] + r[:, None]) * stride
+        landmarks.append(np.stack([kx, ky], axis=2).reshape(-1, 10))
+        
+        scores.append(np.sqrt(np.clip(cls, 0, 1) * np.clip(obj, 0, 1)))
+    
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    landmarks = np.concatenate(landmarks)
+    
+    keep = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), score_threshold, nms_threshold, 1.0, top_k)
+    if len(keep) == 0:
+        return None
+    
+    keep = np.asarray(keep).ravel()
+    return np.hstack([boxes[keep], landmarks[keep], scores[keep, None]]).astype(np.float32)
+
 
 class YuNetDetector:
     """YuNet Face Detection with cross-platform support"""
     
+    SCORE_THRESHOLD = 0.8  # change to 0.7 to increase detction
+    NMS_THRESHOLD = 0.3
+    TOP_K = 5000
+    STRIDES = (8, 16, 32)
+    
     def __init__(self):
         self.detector = None
         self.recognizer = None  # SFace recognizer
-        self.model_dir = Path("models")
-        self.model_dir.mkdir(exist_ok=True)
+        self.model_dir = MODEL_DIR
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        self.backend_id = cv2.dnn.DNN_BACKEND_DEFAULT
+        self.target_id = cv2.dnn.DNN_TARGET_CPU
+        # (embeddings_data, matrix, owners) of the last build_embedding_matrix,
+        # replaced as one tuple so concurrent readers never see a mixed pair
+        self._matrix = None
+        # Raw YuNet network for batched video detection (see detect_batch)
+        self.batch_net = None
+        # Raw SFace network + per-thread reusable input buffer (see extract_features)
+        self.sface_net = None
+        self._buffers = threading.local()
+        # One instance is shared by every Streamlit session, and an OpenCV net
+        # keeps its input between setInput and forward, so each is used under a lock
+        self._detect_lock = threading.Lock()
+        self._batch_net_lock = threading.Lock()
+        self._sface_lock = threading.Lock()
+        # onnxruntime CUDA session used instead of sface_net when enabled
+        self.sface_session = None
+        # Size YuNet was last configured for (see _fit_input_size)
+        self._last_size: Optional[Tuple[int, int]] = None
         
-    def download_model(self) -> bool:
-        """Download YuNet model if not present"""
-        model_path = self.model_dir / "face_detection_yunet_2023mar.onnx"
+    def _download_model(self, filename: str, label: str) -> bool:
+        """Download one of MODEL_SOURCES into model_dir if not present"""
+        model_path = self.model_dir / filename
         
         if model_path.exists():
             return True
         
-        url = "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
+        url, sha256 = MODEL_SOURCES[filename]
         
         try:
-            import urllib.request
-            print(f"Downloading YuNet model from {url}...")
-            urllib.request.urlretrieve(url, model_path)
-            print("✓ Model downloaded successfully")
+            print(f"Downloading {label} model from {url}...")
+            _download(url, model_path, sha256)
+            print(f"✓ {label} model downloaded successfully")
             return True
         except Exception as e:
-            print(f"✗ Failed to download model: {e}")
+            print(f"✗ Failed to download {label} model: {e}")
             return False
     
-    def initialize(self, input_size: Tuple[int, int] = (640, 480)) -> bool:
-        """Initialize YuNet detector"""
+    def download_model(self) -> bool:
+        """Download YuNet model if not present"""
+        return self._download_model("face_detection_yunet_2023mar.onnx", "YuNet")
+    
+    def initialize(self, input_size: Tuple[int, int] = (640, 480),
+                   backend_id: Optional[int] = None, target_id: Optional[int] = None) -> bool:
+        """Initialize YuNet detector
+        
+        backend_id/target_id default to the CUDA backend when a CUDA device
+        is present, otherwise OpenCV's CPU backend.
+        """
         if not self.download_model():
             return False
         
         model_path = self.model_dir / "face_detection_yunet_2023mar.onnx"
         
+        if backend_id is None or target_id is None:
+            backend_id, target_id = get_dnn_backend(use_cuda=True)
+        self.backend_id, self.target_id = backend_id, target_id
+        
         try:
             self.detector = cv2.FaceDetectorYN.create(
                 str(model_path),
                 "", input_size,
-                score_threshold=0.8, # change to 0.7 to increase detction 
-                nms_threshold=0.3,
-                top_k=5000
+                score_threshold=self.SCORE_THRESHOLD,
+                nms_threshold=self.NMS_THRESHOLD,
+                top_k=self.TOP_K,
+                backend_id=backend_id,
+                target_id=target_id
             )
+            self._last_size = tuple(input_size)
             return True
         except Exception as e:
             print(f"✗ Failed to initialize YuNet: {e}")
@@ -60,49 +377,74 @@ class YuNetDetector:
     
     def download_sface_model(self) -> bool:
         """Download SFace model if not present"""
-        model_path = self.model_dir / "face_recognition_sface_2021dec.onnx"
-        
-        if model_path.exists():
-            return True
-        
-        url = "https://github.com/opencv/opencv_zoo/raw/main/models/face_recognition_sface/face_recognition_sface_2021dec.onnx"
-        
-        try:
-            import urllib.request
-            print(f"Downloading SFace model from {url}...")
-            urllib.request.urlretrieve(url, model_path)
-            print("✓ SFace model downloaded successfully")
-            return True
-        except Exception as e:
-            print(f"✗ Failed to download SFace model: {e}")
-            return False
+        return self._download_model("face_recognition_sface_2021dec.onnx", "SFace")
     
-    def initialize_sface(self) -> bool:
-        """Initialize SFace recognizer"""
+    def initialize_sface(self, backend_id: Optional[int] = None, target_id: Optional[int] = None,
+                         use_onnxruntime: bool = False) -> bool:
+        """Initialize SFace recognizer (same backend as the detector unless given)
+        
+        use_onnxruntime runs embedding extraction through onnxruntime's
+        CUDAExecutionProvider (see ort_cuda_available); alignment still uses OpenCV.
+        """
         if not self.download_sface_model():
             return False
         
         model_path = self.model_dir / "face_recognition_sface_2021dec.onnx"
         
+        if backend_id is None or target_id is None:
+            backend_id, target_id = self.backend_id, self.target_id
+        
         try:
             self.recognizer = cv2.FaceRecognizerSF.create(
                 str(model_path),
-                ""
+                "",
+                backend_id,
+                target_id
             )
-            return True
+            # Raw SFace network: takes our own preprocessed (N, 3, 112, 112) blobs
+            self.sface_net = cv2.dnn.readNetFromONNX(str(model_path))
+            self.sface_net.setPreferableBackend(backend_id)
+            self.sface_net.setPreferableTarget(target_id)
         except Exception as e:
             print(f"✗ Failed to initialize SFace: {e}")
             return False
+        
+        self.sface_session = None
+        if use_onnxruntime and ort_cuda_available():
+            try:
+                self.sface_session = self._create_sface_session(model_path)
+            except Exception as e:
+                print(f"✗ onnxruntime SFace unavailable, using OpenCV DNN: {e}")
+        
+        return True
+    
+    def _create_sface_session(self, model_path: Path):
+        """onnxruntime session for SFace with a dynamic batch dimension"""
+        dynamic_path = model_path.with_name(model_path.stem + "_dynamic.onnx")
+        if not dynamic_path.exists():
+            make_batch_dynamic(model_path, dynamic_path)
+        
+        return ort.InferenceSession(
+            str(dynamic_path),
+            providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
+        )
+    
+    def _detect_faces(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Run YuNet on frame, setting its input size only when it changed
+        (setInputSize rebuilds the detector's prior boxes)"""
+        height, width = frame.shape[:2]
+        with self._detect_lock:
+            if (width, height) != self._last_size:
+                self.detector.setInputSize((width, height))
+                self._last_size = (width, height)
+            return self.detector.detect(frame)[1]
     
     def detect(self, frame: np.ndarray) -> Tuple[np.ndarray, int]:
         """Detect faces in frame, return (annotated_frame, face_count)"""
         if self.detector is None:
             return frame, 0
         
-        height, width = frame.shape[:2]
-        self.detector.setInputSize((width, height))
-        
-        _, faces = self.detector.detect(frame)
+        faces = self._detect_faces(frame)
         
         face_count = 0
         if faces is not None:
@@ -140,13 +482,31 @@ class YuNetDetector:
             aligned_face = self.recognizer.alignCrop(frame, face_detection)
             
             # Generate 128D embedding
-            embedding = self.recognizer.feature(aligned_face)
-            
-            return embedding
+            return self.extract_features([aligned_face])
         except Exception as e:
             print(f"✗ Failed to generate embedding: {e}")
             return None
     
+    def extract_features(self, aligned_faces: List[np.ndarray]) -> np.ndarray:
+        """
+        Run SFace on aligned 112x112 face crops.
+        
+        Returns:
+            (N, 128) float32 embeddings, identical to FaceRecognizerSF.feature per crop
+        """
+        n = len(aligned_faces)
+        face_blob = getattr(self._buffers, "face_blob", None)
+        if face_blob is None or len(face_blob) < n:
+            face_blob = self._buffers.face_blob = np.empty((n, 3, 112, 112), dtype=np.float32)
+        
+        blob = aligned_faces_to_blob(aligned_faces, face_blob[:n])
+        if self.sface_session is not None:
+            return self.sface_session.run(None, {"data": blob})[0]
+        
+        with self._sface_lock:
+            self.sface_net.setInput(blob)
+            return self.sface_net.forward()
+    
     def detect_raw(self, frame: np.ndarray) -> Tuple[Optional[np.ndarray], int]:
         """Detect faces without drawing, return (faces_array, face_count)
         
@@ -159,19 +519,79 @@ class YuNetDetector:
         if self.detector is None:
             return None, 0
         
-        height, width = frame.shape[:2]
-        self.detector.setInputSize((width, height))
-        
-        _, faces = self.detector.detect(frame)
+        faces = self._detect_faces(frame)
         
         if faces is None:
             return None, 0
         
         return faces, len(faces)
     
+    def detect_batch(self, frames: List[np.ndarray], max_width: Optional[int] = None) -> List[Optional[np.ndarray]]:
+        """
+        Detect faces in several same-sized frames with one network forward pass
+        on the CUDA backend. On CPU a batched pass is slower than FaceDetectorYN
+        per frame, so frames are detected one at a time there.
+        
+        Args:
+            frames: List of BGR frames, all with the same resolution
+            max_width: Frames wider than this are downscaled for the network;
+                detections are mapped back to full-frame coordinates
+            
+        Returns:
+            List of raw YuNet detections (or None) per frame
+        """
+        if self.detector is None or not frames:
+            return [None] * len(frames)
+        
+        height, width = frames[0].shape[:2]
+        scale = 1.0
+        if max_width and width > max_width:
+            scale = max_width / width
+            height, width = int(round(height * scale)), max_width
+            frames = [cv2.resize(f, (width, height), interpolation=cv2.INTER_AREA) for f in frames]
+        
+        if self.backend_id == cv2.dnn.DNN_BACKEND_CUDA:
+            results = self._detect_batch_net(frames)
+        else:
+            results = [self.detect_raw(f)[0] for f in frames]
+        
+        if scale != 1.0:
+            for faces in results:
+                if faces is not None:
+                    faces[:, :14] /= scale  # boxes and landmarks; column 14 is the score
+        return results
+    
+    def _detect_batch_net(self, frames: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """One raw YuNet forward pass over a batch of same-sized frames"""
+        # YuNet needs input dimensions that are multiples of 32
+        height, width = frames[0].shape[:2]
+        pad_w = ((width - 1) // 32 + 1) * 32
+        pad_h = ((height - 1) // 32 + 1) * 32
+        padded = [
+            cv2.copyMakeBorder(f, 0, pad_h - height, 0, pad_w - width, cv2.BORDER_CONSTANT, value=0)
+            for f in frames
+        ]
+        
+        blob = cv2.dnn.blobFromImages(padded)
+        with self._batch_net_lock:
+            if self.batch_net is None:
+                model_path = self.model_dir / "face_detection_yunet_2023mar.onnx"
+                self.batch_net = cv2.dnn.readNetFromONNX(str(model_path))
+                self.batch_net.setPreferableBackend(self.backend_id)
+                self.batch_net.setPreferableTarget(self.target_id)
+            self.batch_net.setInput(blob)
+            names = self.batch_net.getUnconnectedOutLayersNames()
+            outputs = dict(zip(names, self.batch_net.forward(names)))
+        
+        return [
+            decode_yunet_outputs(outputs, i, (pad_w, pad_h),
+                                 self.SCORE_THRESHOLD, self.NMS_THRESHOLD, self.TOP_K)
+            for i in range(len(frames))
+        ]
+    
     def extract_frame_info(self, video_path: str) -> Dict:
         """Extract video metadata"""
-        cap = cv2.VideoCapture(video_path)
+        cap = open_video(video_path)
         if not cap.isOpened():
             return None
         
@@ -187,20 +607,138 @@ class YuNetDetector:
         return info
     
     def load_embeddings(self) -> Optional[Dict]:
-        """Load enrolled student embeddings from disk"""
-        embeddings_file = Path("data/embeddings/embeddings.json")
+        """
+        Load enrolled student embeddings from disk.
         
-        if not embeddings_file.exists():
-            return None
+        The matrix named by students.json is memory-mapped (zero-copy); each
+        student's "embeddings" is a view of its rows. A legacy embeddings.json
+        is migrated on first load.
         
-        with open(embeddings_file, 'r') as f:
-            return json.load(f)
+        Returns:
+            {'students': {...}, 'matrix': (M, 128) array, 'ids': row owners,
+             'normalized': True} or None if nothing is enrolled
+        """
+        if not STUDENTS_FILE.exists():
+            if not EMBEDDINGS_FILE.exists():
+                return None
+            with open(EMBEDDINGS_FILE, 'r') as f:
+                self.save_embeddings(json.load(f))
+        
+        with open(STUDENTS_FILE, 'r') as f:
+            data = json.load(f)
+        matrix_file = EMBEDDINGS_DIR / data.pop("matrix", EMBEDDINGS_MATRIX_FILE.name)
+        matrix = np.load(matrix_file, mmap_mode='r')
+        
+        owners = []
+        for student_id, student_data in data.get("students", {}).items():
+            start, stop = student_data.pop("rows")
+            student_data["embeddings"] = matrix[start:stop]
+            owners.extend([student_id] * (stop - start))
+        
+        data["matrix"] = matrix
+        data["ids"] = owners
+        data["normalized"] = True
+        
+        self.build_embedding_matrix(data)
+        return data
+    
+    def save_embeddings(self, embeddings_data: Dict) -> None:
+        """
+        Write embeddings as one L2-normalized float32 .npy matrix plus a small
+        students.json holding metadata, the matrix file name and each student's
+        row range.
+        
+        Every save writes a new embeddings_v<n>.npy and swaps students.json in
+        last, so a matrix that readers have memory-mapped is never replaced
+        (which fails on Windows) and a reader never pairs the new matrix with
+        the old row ranges.
+        """
+        EMBEDDINGS_DIR.mkdir(parents=True, exist_ok=True)
+        
+        blocks = []
+        students = {}
+        row = 0
+        for student_id, student_data in embeddings_data.get("students", {}).items():
+            block = np.asarray(student_data["embeddings"], dtype=np.float32).reshape(-1, 128)
+            blocks.append(block)
+            meta = {k: v for k, v in student_data.items() if k != "embeddings"}
+            meta["rows"] = [row, row + len(block)]
+            students[student_id] = meta
+            row += len(block)
+        
+        matrix = normalize_rows(np.concatenate(blocks)) if blocks else np.empty((0, 128), dtype=np.float32)
+        
+        previous = None
+        version = 0
+        if STUDENTS_FILE.exists():
+            try:
+                with open(STUDENTS_FILE, 'r') as f:
+                    current = json.load(f)
+                previous = current.get("matrix", EMBEDDINGS_MATRIX_FILE.name)
+                version = current.get("version", 0)
+            except (OSError, ValueError):
+                pass
+        version += 1
+        matrix_file = EMBEDDINGS_DIR / f"embeddings_v{version}.npy"
+        
+        # Write to per-process temp files and swap in, so readers never see a partial store
+        tmp_matrix = matrix_file.with_name(f"{matrix_file.name}.{os.getpid()}.tmp")
+        with open(tmp_matrix, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp_matrix, matrix_file)
+        
+        tmp_students = STUDENTS_FILE.with_name(f"{STUDENTS_FILE.name}.{os.getpid()}.tmp")
+        with open(tmp_students, 'w') as f:
+            json.dump({"version": version, "matrix": matrix_file.name, "students": students}, f, indent=2)
+        os.replace(tmp_students, STUDENTS_FILE)
+        
+        # Best effort: on Windows a matrix still mapped by a reader can't be deleted yet
+        if previous and previous != matrix_file.name:
+            try:
+                (EMBEDDINGS_DIR / previous).unlink(missing_ok=True)
+            except OSError:
+                pass
+    
+    def build_embedding_matrix(self, embeddings_data: Optional[Dict]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Stack every enrolled embedding into one L2-normalized (M, 128) float32 matrix
+        so matching a face is a single matrix-vector product.
+        
+        Returns:
+            (matrix, owners) - owners[i] is the student_id of matrix row i
+        """
+        cached = self._matrix
+        if cached is not None and cached[0] is embeddings_data:
+            return cached[1], cached[2]
+        
+        if embeddings_data and "matrix" in embeddings_data:
+            matrix, owners = embeddings_data["matrix"], embeddings_data["ids"]
+            self._matrix = (embeddings_data, matrix, owners)
+            return matrix, owners
+        
+        blocks = []
+        owners = []
+        for student_id, student_data in (embeddings_data or {}).get("students", {}).items():
+            block = np.asarray(student_data["embeddings"], dtype=np.float32).reshape(-1, 128)
+            blocks.append(block)
+            owners.extend([student_id] * len(block))
+        
+        if blocks:
+            matrix = np.concatenate(blocks)
+            # Data from load_embeddings() is already normalized
+            if not embeddings_data.get("normalized"):
+                matrix = normalize_rows(matrix)
+        else:
+            matrix = np.empty((0, 128), dtype=np.float32)
+        
+        self._matrix = (embeddings_data, matrix, owners)
+        return matrix, owners
     
     def delete_student(self, student_id: str) -> bool:
         """
         Delete a student's data from all storage locations:
         - data/photos/<student_id>/
-        - data/embeddings/embeddings.json
+        - data/embeddings/ (embeddings_v<n>.npy + students.json)
         - data/metadata/student_info.json
         
         Returns True if successful.
@@ -214,15 +752,12 @@ class YuNetDetector:
             shutil.rmtree(photos_dir)
         
         # 2. Remove from embeddings
-        embeddings_file = Path("data/embeddings/embeddings.json")
-        if embeddings_file.exists():
+        if STUDENTS_FILE.exists() or EMBEDDINGS_FILE.exists():
             try:
-                with open(embeddings_file, 'r') as f:
-                    data = json.load(f)
-                if student_id in data.get("students", {}):
+                data = self.load_embeddings()
+                if data and student_id in data.get("students", {}):
                     del data["students"][student_id]
-                    with open(embeddings_file, 'w') as f:
-                        json.dump(data, f, indent=2)
+                    self.save_embeddings(data)
             except Exception as e:
                 print(f"✗ Failed to update embeddings: {e}")
                 success = False
@@ -245,17 +780,19 @@ class YuNetDetector:
     
     @staticmethod
     def cosine_similarity(embedding1, embedding2) -> float:
-        """Calculate cosine similarity between two embeddings"""
-        embedding1 = np.array(embedding1).flatten()
-        embedding2 = np.array(embedding2).flatten()
+        """Calculate cosine similarity between two embeddings
         
-        dot_product = np.dot(embedding1, embedding2)
-        norm1 = np.linalg.norm(embedding1)
-        norm2 = np.linalg.norm(embedding2)
+        Matching itself goes through recognize_faces (one matrix product);
+        this is for one-off comparisons.
+        """
+        # asarray/ravel avoid copies for float32 ndarrays
+        e1 = np.asarray(embedding1, dtype=np.float32).ravel()
+        e2 = np.asarray(embedding2, dtype=np.float32).ravel()
         
-        if norm1 == 0 or norm2 == 0:
+        denom = np.sqrt(np.vdot(e1, e1) * np.vdot(e2, e2))
+        if denom == 0:
             return 0.0
-        return dot_product / (norm1 * norm2)
+        return float(np.dot(e1, e2) / denom)
     
     def recognize_face(self, embedding, embeddings_data, threshold=0.363):
         """
@@ -264,20 +801,37 @@ class YuNetDetector:
         Returns:
             (student_id, student_name, similarity) or (None, None, 0)
         """
-        best_match = None
-        best_similarity = 0
+        probe = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        if not np.any(probe):
+            return None, None, 0
         
-        for student_id, student_data in embeddings_data["students"].items():
-            for enrolled_embedding in student_data["embeddings"]:
-                similarity = self.cosine_similarity(embedding, enrolled_embedding)
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = student_id
+        return self.recognize_faces(probe, embeddings_data, threshold)[0]
+    
+    def recognize_faces(self, embeddings: np.ndarray, embeddings_data, threshold=0.363) -> List[Tuple]:
+        """
+        Match a (N, 128) batch of face embeddings against enrolled students
+        with a single matrix product.
         
-        if best_similarity >= threshold:
-            return best_match, embeddings_data["students"][best_match]["name"], best_similarity
+        Returns:
+            One (student_id, student_name, similarity) or (None, None, similarity) per row
+        """
+        matrix, owners = self.build_embedding_matrix(embeddings_data)
+        if not owners:
+            return [(None, None, 0)] * len(embeddings)
         
-        return None, None, best_similarity
+        probes = normalize_rows(np.array(embeddings, dtype=np.float32))
+        sims = probes @ matrix.T
+        best = np.argmax(sims, axis=1)
+        best_similarity = np.maximum(sims[np.arange(len(best)), best], 0.0)
+        
+        results = []
+        for idx, similarity in zip(best.tolist(), best_similarity.tolist()):
+            if similarity >= threshold:
+                best_match = owners[idx]
+                results.append((best_match, embeddings_data["students"][best_match]["name"], similarity))
+            else:
+                results.append((None, None, similarity))
+        return results
     
     def detect_and_recognize(self, frame: np.ndarray, embeddings_data: Optional[Dict] = None) -> Tuple[np.ndarray, int, List[Dict]]:
         """
@@ -294,127 +848,319 @@ class YuNetDetector:
         if self.detector is None:
             return frame, 0, []
         
-        height, width = frame.shape[:2]
-        self.detector.setInputSize((width, height))
+        faces, _ = self.detect_raw(frame)
+        return self.annotate_and_recognize(frame, faces, embeddings_data)
+    
+    def embed_faces(self, frames: List[np.ndarray], faces_list: List[Optional[np.ndarray]]) -> List[Optional[np.ndarray]]:
+        """
+        Align every detected face across a batch of frames and embed them
+        with one SFace forward pass.
+        
+        Returns:
+            Per frame, a (num_faces, 128) array of embeddings (None if no faces)
+        """
+        if self.recognizer is None and not self.initialize_sface():
+            return [None] * len(frames)
+        
+        crops = []
+        counts = []
+        for frame, faces in zip(frames, faces_list):
+            n = 0 if faces is None else len(faces)
+            crops.extend(self.recognizer.alignCrop(frame, face) for face in (faces if n else ()))
+            counts.append(n)
+        
+        if not crops:
+            return [None] * len(frames)
+        
+        features = self.extract_features(crops)
         
-        _, faces = self.detector.detect(frame)
+        embeddings = []
+        start = 0
+        for n in counts:
+            embeddings.append(features[start:start + n] if n else None)
+            start += n
+        return embeddings
+    
+    def annotate_and_recognize_batch(self, frames: List[np.ndarray], faces_list: List[Optional[np.ndarray]],
+                                     embeddings_data: Optional[Dict] = None,
+                                     draw: bool = True) -> List[Tuple[np.ndarray, int, List[Dict]]]:
+        """annotate_and_recognize for a batch of frames, embedding all faces at once"""
+        if embeddings_data:
+            embeddings_list = self.embed_faces(frames, faces_list)
+        else:
+            embeddings_list = [None] * len(frames)
+        
+        return [
+            self.annotate_and_recognize(frame, faces, embeddings_data, embeddings, draw)
+            for frame, faces, embeddings in zip(frames, faces_list, embeddings_list)
+        ]
+    
+    def annotate_and_recognize(self, frame: np.ndarray, faces: Optional[np.ndarray],
+                               embeddings_data: Optional[Dict] = None,
+                               embeddings: Optional[np.ndarray] = None,
+                               draw: bool = True) -> Tuple[np.ndarray, int, List[Dict]]:
+        """
+        Recognize already-detected faces and draw labelled boxes on the frame.
+        embeddings may hold precomputed (num_faces, 128) SFace features.
+        With draw=False the frame is left untouched (recognition only).
         
+        Returns:
+            (annotated_frame, face_count, recognized_list)
+        """
         face_count = 0
         recognized = []
         
         if faces is not None:
             face_count = len(faces)
             
-            # Ensure SFace is initialized for recognition
-            if embeddings_data and self.recognizer is None:
-                self.initialize_sface()
+            # Embed and match all faces of the frame at once
+            matches = [(None, None, 0.0)] * face_count
+            if embeddings_data:
+                if embeddings is None:
+                    embeddings = self.embed_faces([frame], [faces])[0]
+                if embeddings is not None:
+                    matches = self.recognize_faces(embeddings, embeddings_data)
             
-            for face in faces:
-                x, y, w, h = int(face[0]), int(face[1]), int(face[2]), int(face[3])
-                
-                label = "Unknown"
-                color = (0, 0, 255)  # Red for unknown
-                student_id = None
-                similarity = 0.0
-                
-                # Try recognition if embeddings are available
-                if embeddings_data and self.recognizer is not None:
-                    embedding = self.get_face_embedding(frame, face)
-                    if embedding is not None:
-                        student_id, name, similarity = self.recognize_face(
-                            embedding, embeddings_data
-                        )
-                        if student_id:
-                            label = f"{name.strip()} ({similarity:.0%})"
-                            color = (0, 255, 0)  # Green for recognized
-                            recognized.append({
-                                'name': name.strip(),
-                                'student_id': student_id,
-                                'similarity': similarity
-                            })
-                        else:
-                            label = f"Unknown ({similarity:.0%})"
-                
-                # Draw bounding box and label
-                cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-                
-                # Draw label background for readability
-                label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-                cv2.rectangle(frame, (x, y - label_size[1] - 10), (x + label_size[0], y), color, -1)
-                cv2.putText(frame, label, (x, y - 5),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            for student_id, name, similarity in matches:
+                if student_id:
+                    recognized.append({
+                        'name': name.strip(),
+                        'student_id': student_id,
+                        'similarity': similarity
+                    })
+            
+            if draw:
+                # Integer boxes for the whole frame in one conversion
+                boxes = faces[:, :4].astype(np.int32).tolist()
+                scored = bool(embeddings_data) and embeddings is not None
+                for box, (student_id, name, similarity) in zip(boxes, matches):
+                    if student_id:
+                        label = f"{name.strip()} ({similarity:.0%})"
+                        color = (0, 255, 0)  # Green for recognized
+                    else:
+                        label = f"Unknown ({similarity:.0%})" if scored else "Unknown"
+                        color = (0, 0, 255)  # Red for unknown
+                    draw_face_label(frame, box, label, color)
         
         return frame, face_count, recognized
     
+    def _read_frame_batches(self, cap: cv2.VideoCapture, batch_size: int, frame_stride: int,
+                            free_frames: Optional[deque] = None):
+        """
+        Yield (frame_nums, frames) batches of every frame_stride-th frame.
+        Skipped frames are only grabbed, never decoded.
+        Frames are decoded into buffers recycled through free_frames when available.
+        """
+        frame_stride = max(1, frame_stride)
+        read_index = 0
+        
+        while True:
+            frames = []
+            frame_nums = []
+            while len(frames) < batch_size:
+                if not cap.grab():
+                    break
+                if read_index % frame_stride == 0:
+                    try:
+                        buf = free_frames.popleft() if free_frames is not None else None
+                    except IndexError:
+                        buf = None
+                    ret, frame = cap.retrieve(buf)
+                    if ret:
+                        frames.append(frame)
+                        frame_nums.append(read_index)
+                read_index += 1
+            
+            if not frames:
+                return
+            yield frame_nums, frames
+    
+    def _best_frame_thumbnails(self, cap: cv2.VideoCapture, frame_nums, embeddings_data: Optional[Dict],
+                               detect_max_width: Optional[int] = None) -> Dict[int, bytes]:
+        """
+        Re-read, annotate and JPEG-encode the given frames (frame_num -> bytes).
+        Frames that can no longer be read are left out.
+        """
+        frames = {}
+        # Seek in frame order so consecutive reads move forward through the file
+        for frame_num in sorted(frame_nums):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+            ret, frame = cap.read()
+            if ret:
+                frames[frame_num] = frame
+        
+        if not frames:
+            return {}
+        
+        annotated = []
+        for frame in frames.values():
+            faces = self.detect_batch([frame], detect_max_width)[0]
+            annotated.append(self.annotate_and_recognize(frame, faces, embeddings_data)[0])
+        
+        # Keep only small JPEG thumbnails (st.image accepts bytes).
+        # cv2.imencode releases the GIL, so frames are encoded in parallel.
+        with ThreadPoolExecutor() as pool:
+            return dict(zip(frames.keys(), pool.map(encode_thumbnail, annotated)))
+    
     def process_video_with_recognition(self, video_path: str, embeddings_data: Optional[Dict] = None,
-                                        progress_callback: Optional[Callable] = None) -> Dict:
+                                        progress_callback: Optional[Callable] = None,
+                                        batch_size: int = 8, frame_stride: int = 5,
+                                        min_update_interval: float = 0.1,
+                                        detect_max_width: Optional[int] = 1280) -> Dict:
         """
         Process video with face detection AND recognition.
+        Only every frame_stride-th frame is analyzed; sampled frames are
+        detected in batches of batch_size (one forward pass per batch).
+        Decoding and detection run on background threads so they overlap
+        with recognition on the calling thread.
+        progress_callback is called at most once per min_update_interval seconds.
+        Frames wider than detect_max_width are downscaled for detection only;
+        embeddings are still taken from the full-resolution frame.
         
         Returns dict with:
             - total_frames, max_faces, avg_faces, total_face_detections
-            - best_frames: dict of student_id -> {frame_num, image, similarity, name}
-            - recognized_students: dict of all unique recognized students with confidence
-            - frames_processed: actual number of frames analyzed
+            - best_frames: dict of student_id -> {frame_num, image (JPEG bytes), similarity, name}
+            - recognized_students: dict of all unique recognized students with confidence,
+              ordered by frames_appeared (descending)
+            - frames_processed: actual number of (sampled) frames analyzed
         """
-        cap = cv2.VideoCapture(video_path)
+        cap = open_video(video_path)
         if not cap.isOpened():
             return None
         
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        frame_data = []
-        face_counts = []
-        all_recognized = {}  # student_id -> {name, similarity, frames_appeared}
-        best_frames = {}     # student_id -> {frame_num, annotated_image, similarity, name}
+        # Per-student aggregation in flat arrays indexed by enrolled-student position
+        student_ids = list((embeddings_data or {}).get("students", {}).keys())
+        student_index = {sid: i for i, sid in enumerate(student_ids)}
+        frames_appeared = np.zeros(len(student_ids), dtype=np.int32)
+        best_similarity = np.zeros(len(student_ids), dtype=np.float32)
+        best_frame_num = np.full(len(student_ids), -1, dtype=np.int64)
+        student_names = [''] * len(student_ids)
         
-        frame_num = 0
+        # Running face-count stats; nothing per frame is retained
+        max_faces = 0
+        total_face_detections = 0
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Detect AND recognize faces
-            annotated_frame, face_count, recognized = self.detect_and_recognize(frame, embeddings_data)
-            
-            # Track recognized students and their best frames
-            for r in recognized:
-                sid = r['student_id']
-                if sid not in all_recognized:
-                    all_recognized[sid] = {'name': r['name'], 'similarity': r['similarity'], 'frames_appeared': 0}
-                all_recognized[sid]['frames_appeared'] += 1
+        frames_processed = 0
+        last_update = float("-inf")
+        
+        # Three-stage pipeline: decode thread -> detection thread -> recognition here.
+        # Bounded queues keep at most a few batches of frames in memory.
+        decoded = queue.Queue(maxsize=4)
+        detected = queue.Queue(maxsize=4)
+        stop = threading.Event()
+        errors = []
+        # Frame buffers handed back by the recognition stage for the decoder to
+        # reuse, so steady state decodes into the same few arrays. Nothing is
+        # kept past its batch: best frames are re-read once the pass is done.
+        free_frames = deque()
+        
+        def decode_stage():
+            try:
+                for batch in self._read_frame_batches(cap, batch_size, frame_stride, free_frames):
+                    if not _put(decoded, batch, stop):
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                _put(decoded, None, stop)
+        
+        def detect_stage():
+            try:
+                while True:
+                    batch = _get(decoded, stop)
+                    if batch is None:
+                        break
+                    frame_nums, frames = batch
+                    faces_list = self.detect_batch(frames, detect_max_width)
+                    if not _put(detected, (frame_nums, frames, faces_list), stop):
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                _put(detected, None, stop)
+        
+        workers = [threading.Thread(target=decode_stage, daemon=True),
+                   threading.Thread(target=detect_stage, daemon=True)]
+        for worker in workers:
+            worker.start()
+        
+        try:
+            while True:
+                batch = _get(detected, stop)
+                if batch is None:
+                    break
                 
-                # Track best frame (highest similarity) for each student
-                if sid not in best_frames or r['similarity'] > best_frames[sid]['similarity']:
-                    all_recognized[sid]['similarity'] = r['similarity']
-                    best_frames[sid] = {
-                        'frame_num': frame_num,
-                        'annotated_image': annotated_frame.copy(),
-                        'similarity': r['similarity'],
-                        'name': r['name']
-                    }
-            
-            frame_data.append({
-                'frame_num': frame_num,
-                'face_count': face_count,
-            })
-            face_counts.append(face_count)
+                frame_nums, frames, faces_list = batch
+                # Frames are not kept, so skip drawing (best frames are drawn later)
+                results = self.annotate_and_recognize_batch(frames, faces_list, embeddings_data, draw=False)
+                
+                for frame_num, (_, face_count, recognized) in zip(frame_nums, results):
+                    # Track recognized students and their best frames
+                    for r in recognized:
+                        sid = r['student_id']
+                        idx = student_index[sid]
+                        frames_appeared[idx] += 1
+                        
+                        # Track best frame (highest similarity) for each student
+                        if r['similarity'] > best_similarity[idx]:
+                            best_similarity[idx] = r['similarity']
+                            best_frame_num[idx] = frame_num
+                            student_names[idx] = r['name']
+                    
+                    max_faces = max(max_faces, face_count)
+                    total_face_detections += face_count
+                    
+                    frames_processed += 1
+                    
+                    # Throttle callbacks: each one is a UI round-trip for Streamlit
+                    now = time.monotonic()
+                    if progress_callback and now - last_update >= min_update_interval:
+                        last_update = now
+                        progress = min((frame_num + 1) / max(total_frames, 1), 1.0)
+                        progress_callback(progress)
+                
+                # Done with this batch: recycle its frame buffers
+                free_frames.extend(frames)
             
-            if progress_callback:
-                progress = (frame_num + 1) / total_frames
-                progress_callback(progress)
+            stop.set()
+            for worker in workers:
+                worker.join()
+            if errors:
+                raise errors[0]
             
-            frame_num += 1
+            # Re-read and annotate only the frames that ended up best for some
+            # student, instead of copying every improving frame during the pass
+            seen = np.flatnonzero(frames_appeared)
+            thumbnails = self._best_frame_thumbnails(
+                cap, {int(best_frame_num[idx]) for idx in seen}, embeddings_data, detect_max_width)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+            cap.release()
         
-        cap.release()
+        if errors:
+            raise errors[0]
+        
+        if progress_callback:
+            progress_callback(1.0)
         
-        # Add total processed frame count to each recognized student
-        frames_processed = frame_num
-        for sid in all_recognized:
-            all_recognized[sid]['total_frames'] = frames_processed
+        # Build the per-student summary, most frequently seen first
+        all_recognized = {}  # student_id -> {name, similarity, frames_appeared, total_frames}
+        for idx in np.argsort(-frames_appeared, kind='stable'):
+            if frames_appeared[idx] == 0:
+                break
+            sid = student_ids[idx]
+            all_recognized[sid] = {
+                'name': student_names[idx],
+                'similarity': float(best_similarity[idx]),
+                'frames_appeared': int(frames_appeared[idx]),
+                'total_frames': frames_processed
+            }
         
-        if not face_counts:
+        if not frames_processed:
             return {
                 'total_frames': 0,
                 'max_faces': 0,
@@ -425,22 +1171,23 @@ class YuNetDetector:
                 'frames_processed': 0
             }
         
-        # Convert best frames to RGB for Streamlit
-        best_frames_rgb = {}
-        for sid, finfo in best_frames.items():
-            best_frames_rgb[sid] = {
-                'frame_num': finfo['frame_num'],
-                'image': cv2.cvtColor(finfo['annotated_image'], cv2.COLOR_BGR2RGB),
-                'similarity': finfo['similarity'],
-                'name': finfo['name']
+        best_frames_jpeg = {
+            student_ids[idx]: {
+                'frame_num': int(best_frame_num[idx]),
+                'image': thumbnails[int(best_frame_num[idx])],
+                'similarity': float(best_similarity[idx]),
+                'name': student_names[idx]
             }
+            for idx in seen
+            if int(best_frame_num[idx]) in thumbnails
+        }
         
         return {
             'total_frames': total_frames,
-            'max_faces': max(face_counts),
-            'avg_faces': round(sum(face_counts) / len(face_counts), 2),
-            'total_face_detections': sum(face_counts),
-            'best_frames': best_frames_rgb,
+            'max_faces': max_faces,
+            'avg_faces': round(total_face_detections / frames_processed, 2),
+            'total_face_detections': total_face_detections,
+            'best_frames': best_frames_jpeg,
             'recognized_students': all_recognized,
             'frames_processed': frames_processed
         }
@@ -12,7 +12,7 @@ from pathlib import Path
 from datetime import datetime
 from uuid import uuid4
 from supabase import create_client
-from detector import YuNetDetector
+from detector import YuNetDetector, normalize_rows
 
 
 # Page config
@@ -31,11 +31,15 @@ if 'camera_input_counter' not in st.session_state:
     st.session_state.camera_input_counter = 0
 if 'last_photo_signature' not in st.session_state:
     st.session_state.last_photo_signature = None
-if 'detector' not in st.session_state:
-    with st.spinner("Getting things ready..."):
-        st.session_state.detector = YuNetDetector()
-        st.session_state.detector_initialized = st.session_state.detector.initialize()
-        st.session_state.sface_initialized = st.session_state.detector.initialize_sface()
+
+
+@st.cache_resource(show_spinner="Getting things ready...")
+def get_detector():
+    """Singleton detector shared across reruns and sessions"""
+    detector = YuNetDetector()
+    detector.initialize()
+    detector.initialize_sface()
+    return detector
 
 
 # Create data directory structure
@@ -100,19 +104,13 @@ def resolve_supabase_name_column(supabase, table_name):
 
 
 def load_embeddings():
-    """Load embeddings from JSON file"""
-    embeddings_file = EMBEDDINGS_DIR / "embeddings.json"
-    if embeddings_file.exists():
-        with open(embeddings_file, 'r') as f:
-            return json.load(f)
-    return {"students": {}}
+    """Load embeddings (.npy matrix + students.json, see YuNetDetector.load_embeddings)"""
+    return get_detector().load_embeddings() or {"students": {}}
 
 
 def save_embeddings(data):
-    """Save embeddings to JSON file"""
-    embeddings_file = EMBEDDINGS_DIR / "embeddings.json"
-    with open(embeddings_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Save embeddings as a .npy matrix + students.json"""
+    get_detector().save_embeddings(data)
 
 
 def load_metadata():
@@ -298,7 +296,7 @@ def main():
             if frame is None:
                 st.error("Could not read photo. Please retake.")
             else:
-                faces, num_faces = st.session_state.detector.detect_raw(frame)
+                faces, num_faces = get_detector().detect_raw(frame)
                 display_frame = frame.copy()
                 is_good = False
 
@@ -318,12 +316,12 @@ def main():
                 # Auto-save each newly captured valid photo (no extra Add button).
                 is_new_photo = st.session_state.last_photo_signature != photo_signature
                 if is_good and is_new_photo:
-                    embedding = st.session_state.detector.get_face_embedding(frame, faces[0])
+                    embedding = get_detector().get_face_embedding(frame, faces[0])
                     if embedding is None:
                         st.error("Could not save this photo. Please retake.")
                     else:
                         st.session_state.enrollment_captures.append({
-                            'embedding': embedding.tolist(),
+                            'embedding': np.asarray(embedding, dtype=np.float32).ravel(),
                             'image': cv2.cvtColor(frame, cv2.COLOR_BGR2RGB),
                             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         })
@@ -400,7 +398,14 @@ def main():
                 storage_bucket = supabase.storage.from_(supabase_bucket_name)
                 enrollment_uuid = str(uuid4())
 
-                embeddings_list = [capture['embedding'] for capture in st.session_state.enrollment_captures]
+                # One contiguous, L2-normalized (num_photos, 128) block per student,
+                # so it can be matched with a single matrix product
+                captures = st.session_state.enrollment_captures
+                embeddings = np.empty((len(captures), 128), dtype=np.float32)
+                for i, capture in enumerate(captures):
+                    embeddings[i] = capture['embedding']
+                embeddings = normalize_rows(embeddings)
+                embeddings_list = embeddings.tolist()  # JSON payload for Supabase
                 photo_urls = []
 
                 # Upload photos to Supabase Storage and collect URLs.
@@ -444,9 +449,9 @@ def main():
                 embeddings_data["students"][record_id] = {
                     "student_id": st.session_state.student_id,
                     "name": st.session_state.student_name,
-                    "embeddings": embeddings_list,
+                    "embeddings": embeddings,
                     "enrolled_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "num_embeddings": len(embeddings_list)
+                    "num_embeddings": len(embeddings)
                 }
                 save_embeddings(embeddings_data)
                 
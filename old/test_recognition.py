@@ -5,35 +5,36 @@ Test if enrolled students are recognized from webcam
 """
 
 import cv2
-import json
 import numpy as np
-from pathlib import Path
 from detector import YuNetDetector, init_camera
 
+# Same-person SFace similarity rarely goes above ~0.95, so no other enrolled
+# face can plausibly beat a match this good; stop scanning once we see one
+EARLY_EXIT_SIMILARITY = 0.85
+
 
 def load_embeddings():
     """Load enrolled student embeddings"""
-    embeddings_file = Path("data/embeddings/embeddings.json")
+    embeddings_data = YuNetDetector().load_embeddings()
     
-    if not embeddings_file.exists():
+    if not embeddings_data:
         print("❌ No embeddings found. Please enroll students first.")
         print("   Run: streamlit run enrollment_app.py")
         return None
     
-    with open(embeddings_file, 'r') as f:
-        return json.load(f)
+    return embeddings_data
 
 
 def cosine_similarity(embedding1, embedding2):
     """Calculate cosine similarity between two embeddings"""
-    embedding1 = np.array(embedding1).flatten()  # Ensure 1D array
-    embedding2 = np.array(embedding2).flatten()  # Ensure 1D array
-    
-    dot_product = np.dot(embedding1, embedding2)
-    norm1 = np.linalg.norm(embedding1)
-    norm2 = np.linalg.norm(embedding2)
-    
-    return dot_product / (norm1 * norm2)
+    # asarray/ravel avoid copies for float32 ndarrays
+    embedding1 = np.asarray(embedding1, dtype=np.float32).ravel()
+    embedding2 = np.asarray(embedding2, dtype=np.float32).ravel()
+    
+    denom = np.sqrt(np.vdot(embedding1, embedding1) * np.vdot(embedding2, embedding2))
+    if denom == 0:
+        return 0.0
+    return float(np.dot(embedding1, embedding2) / denom)
 
 
 def recognize_face(embedding, embeddings_data, threshold=0.363):
@@ -52,16 +53,31 @@ def recognize_face(embedding, embeddings_data, threshold=0.363):
     best_match_id = None
     best_similarity = 0
     
+    # Normalize the probe once; load_embeddings() rows are already unit
+    # length, so each comparison is then a plain dot product
+    probe = np.asarray(embedding, dtype=np.float32).ravel()
+    probe_norm = np.linalg.norm(probe)
+    if probe_norm == 0:
+        return None, None, 0
+    probe = probe / probe_norm
+    normalized = embeddings_data.get("normalized", False)
+    
     for record_key, student_data in embeddings_data["students"].items():
         display_student_id = student_data.get("student_id", record_key)
         # Compare against all enrolled embeddings for this student
         for enrolled_embedding in student_data["embeddings"]:
-            similarity = cosine_similarity(embedding, enrolled_embedding)
+            if normalized:
+                similarity = float(np.dot(probe, enrolled_embedding))
+            else:
+                similarity = cosine_similarity(probe, enrolled_embedding)
             
             if similarity > best_similarity:
                 best_similarity = similarity
                 best_match_key = record_key
                 best_match_id = display_student_id
+        
+        if best_similarity > EARLY_EXIT_SIMILARITY:
+            break
     
     if best_similarity >= threshold:
         return best_match_id, embeddings_data["students"][best_match_key]["name"], best_similarity
@@ -115,15 +131,19 @@ def main():
     print("  - Press 'q' to quit")
     print("="*60 + "\n")
     
+    frame = None
     while True:
-        ret, frame = cap.read()
+        # Decode into the previous frame's buffer instead of a new array
+        ret, frame = cap.read(frame)
         if not ret:
             break
         
         # Detect faces
         faces, num_faces = detector.detect_raw(frame)
         
-        display_frame = frame.copy()
+        # Detection and embedding are done before anything is drawn, so
+        # annotate the frame in place rather than a copy of it
+        display_frame = frame
         
         if faces is not None and num_faces > 0:
             # Process first detected face
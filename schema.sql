@@ -10,9 +10,13 @@ CREATE TABLE profiles (
   id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
   email TEXT,
   name TEXT,
+  -- trimmed, lowercased, single-spaced name for duplicate checks
+  name_normalized TEXT GENERATED ALWAYS AS
+    (lower(regexp_replace(btrim(name), '\s+', ' ', 'g'))) STORED,
   role TEXT DEFAULT 'student',          -- 'student' | 'teacher'
   student_id TEXT UNIQUE,               -- roll number (NULL for teachers)
   embeddings JSONB,                     -- face embedding vectors (NULL for teachers)
+  embedding_template BYTEA,             -- normalized mean embedding, 128 int8 (recognition)
   photo_urls JSONB,                     -- enrollment photo URLs (NULL for teachers)
   enrollment_status TEXT DEFAULT 'pending',  -- 'pending' | 'active' (face registration)
   created_at TIMESTAMPTZ NOT NULL DEFAULT now()
@@ -100,9 +104,71 @@ ON CONFLICT (id) DO NOTHING;
 CREATE INDEX idx_courses_teacher ON courses(teacher_id);
 CREATE INDEX idx_course_enrollments_course ON course_enrollments(course_id);
 CREATE INDEX idx_course_enrollments_user ON course_enrollments(user_id);
-CREATE INDEX idx_attendance_sessions_course ON attendance_sessions(course_id);
-CREATE INDEX idx_attendance_records_session ON attendance_records(session_id);
+-- History pages filter by course or teacher and order by processed_at
+CREATE INDEX idx_attendance_sessions_course ON attendance_sessions(course_id, processed_at DESC);
+CREATE INDEX idx_attendance_sessions_teacher ON attendance_sessions(teacher_id, processed_at DESC);
+-- Records are read per session, ordered by student name
+CREATE INDEX idx_attendance_records_session ON attendance_records(session_id, student_name);
 CREATE INDEX idx_profiles_role ON profiles(role);
+CREATE INDEX idx_profiles_name_normalized ON profiles(name_normalized);
+
+-- Enrolled names are unique after trimming, lowercasing and collapsing
+-- whitespace; the backend maps violations of this index to HTTP 409
+CREATE UNIQUE INDEX idx_profiles_active_normalized_name
+  ON profiles (name_normalized)
+  WHERE enrollment_status = 'active';
+
+-- 9. COURSE EMBEDDINGS VERSION
+-- Bumped whenever a course's recognition data can change (membership,
+-- a member's embeddings, name or enrollment status). The backend keeps a
+-- memory-mapped copy of each course's embeddings and reuses it only while
+-- this version is unchanged.
+CREATE TABLE course_embeddings_version (
+  course_id UUID PRIMARY KEY REFERENCES courses(id) ON DELETE CASCADE,
+  version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_course_embeddings_version(target_course UUID)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO course_embeddings_version (course_id, version)
+  VALUES (target_course, 1)
+  ON CONFLICT (course_id)
+  DO UPDATE SET version = course_embeddings_version.version + 1;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION on_course_enrollment_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM bump_course_embeddings_version(OLD.course_id);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM bump_course_embeddings_version(NEW.course_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE TRIGGER course_enrollments_embeddings_version
+  AFTER INSERT OR UPDATE OR DELETE ON course_enrollments
+  FOR EACH ROW EXECUTE FUNCTION on_course_enrollment_changed();
+
+CREATE OR REPLACE FUNCTION on_profile_face_data_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM bump_course_embeddings_version(ce.course_id)
+  FROM course_enrollments ce
+  WHERE ce.user_id = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE TRIGGER profiles_embeddings_version
+  AFTER UPDATE OF embeddings, embedding_template, name, student_id, enrollment_status
+  ON profiles
+  FOR EACH ROW EXECUTE FUNCTION on_profile_face_data_changed();
 
 -- ============================================
 -- STORAGE: Also create a public bucket named